@@ -0,0 +1,335 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+The benchmark workloads and the runner.  Each workload runs in its own
+process against its own FakeServer process, so the peak memory reported
+is that of the client alone and the server doesn't compete with it for
+the GIL.
+"""
+
+__all__ = ['WORKLOADS' , 'Options' , 'runWorkload' , 'runAll' ,
+    'compareResults' , 'formatResults']
+
+from FakeServer import FakeServer
+from multiprocessing import Process , Queue
+from libg3.Workers import parallelMap
+import libg3 , os , sys , time , shutil , tempfile , resource , threading , \
+    traceback
+
+class Options(object):
+    """
+    The benchmark settings.  Any keyword args override the defaults.
+    """
+    defaults = {
+        # Server
+        'latency': 0.002 ,
+        'fanout': 3 ,
+        'depth': 2 ,
+        'photos': 20 ,
+        'photoSize': 100000 ,
+        'descSize': 200 ,
+        # Client
+        'concurrency': 4 ,
+        'poolSize': 8 ,
+        # Workload sizes
+        'uploads': 50 ,
+        'tagItems': 50 ,
+        'tagsPerItem': 3 ,
+    }
+
+    def __init__(self , **kwargs):
+        for k , v in self.defaults.items():
+            setattr(self , k , kwargs.pop(k , v))
+        if kwargs:
+            raise TypeError('Unknown options: %s' % ', '.join(kwargs))
+
+    def serverArgs(self):
+        return {
+            'latency': self.latency ,
+            'fanout': self.fanout ,
+            'depth': self.depth ,
+            'photos': self.photos ,
+            'photoSize': self.photoSize ,
+            'descSize': self.descSize ,
+        }
+
+    def asDict(self):
+        return dict((k , getattr(self , k)) for k in self.defaults)
+
+class _LatencyRecorder(libg3.RequestObserver):
+    """
+    Keeps the exact latency of every request, for the percentiles
+    """
+    def __init__(self):
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def postRequest(self , info):
+        with self._lock:
+            self.latencies.append(info.elapsed)
+
+def _percentile(values , p):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = int(round((len(values) - 1) * p / 100.0))
+    return values[idx]
+
+#
+# The workloads.  Each is called with a fresh Gallery3 object, a dict of
+# the urls of the items on the server ("all", "album" and "photo") and the
+# options, and returns the number of units of work done and the name of
+# the unit.  Setup work that shouldn't be timed is done in an optional
+# "<name>Setup" function, which is also passed a temporary directory, and
+# returns the extra args for the workload.
+#
+
+def traversal(gal , urls , opts):
+    """
+    Walks the whole tree with Gallery3.walk()
+    """
+    n = 0
+    for item in gal.walk(gal.getRoot()):
+        n += 1
+    return (n , 'items')
+
+def batchFetch(gal , urls , opts):
+    """
+    Fetches every item by url with Gallery3.getItemsForUrls()
+    """
+    items = gal.getItemsForUrls(urls['all'])
+    return (len(items) , 'items')
+
+def uploadSetup(gal , urls , opts , tmpDir):
+    paths = []
+    data = os.urandom(min(opts.photoSize , 65536))
+    for i in xrange(opts.uploads):
+        path = os.path.join(tmpDir , 'upload%d.jpg' % i)
+        fh = open(path , 'wb')
+        try:
+            left = opts.photoSize
+            while left > 0:
+                fh.write(data[:left])
+                left -= len(data)
+        finally:
+            fh.close()
+        paths.append(path)
+    return (gal.getRoot() , [libg3.LocalImage(p) for p in paths])
+
+def upload(gal , urls , opts , root , images):
+    """
+    Uploads images with Gallery3.addImages()
+    """
+    items = gal.addImages(root , images)
+    return (len(items) , 'images')
+
+def downloadSetup(gal , urls , opts , tmpDir):
+    return (gal.getItemsForUrls(urls['photo']) , tmpDir)
+
+def download(gal , urls , opts , images , tmpDir):
+    """
+    Downloads every photo with RemoteImage.saveTo()
+    """
+    def save(image):
+        image.saveTo(os.path.join(tmpDir , '%s.jpg' % image.id))
+
+    parallelMap(save , images , opts.concurrency)
+    return (len(images) , 'files')
+
+def taggingSetup(gal , urls , opts , tmpDir):
+    return (gal.getItemsForUrls(urls['photo'][:opts.tagItems]) ,)
+
+def tagging(gal , urls , opts , items):
+    """
+    Applies tagsPerItem tags to each of tagItems photos
+    """
+    jobs = []
+    for item in items:
+        for i in xrange(opts.tagsPerItem):
+            jobs.append((item , 'tag%d' % i))
+
+    def tag(job):
+        gal.tagItem(*job)
+
+    parallelMap(tag , jobs , opts.concurrency)
+    return (len(jobs) , 'tags')
+
+WORKLOADS = ['traversal' , 'batchFetch' , 'upload' , 'download' , 'tagging']
+
+def _runInChild(name , opts , host , port , urls , queue):
+    """
+    Runs the workload and puts its results (or the error) on the queue
+    """
+    try:
+        mod = sys.modules[__name__]
+        func = getattr(mod , name)
+        setup = getattr(mod , '%sSetup' % name , None)
+        gal = libg3.Gallery3(host , 'benchmark' , port=port ,
+            poolSize=opts.poolSize , concurrency=opts.concurrency)
+        tmpDir = tempfile.mkdtemp(prefix='g3bench')
+        try:
+            args = ()
+            if setup is not None:
+                args = setup(gal , urls , opts , tmpDir)
+            gal.statsCollector.reset()
+            recorder = _LatencyRecorder()
+            gal.addObserver(recorder)
+            rssBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.time()
+            units , unitName = func(gal , urls , opts , *args)
+            elapsed = time.time() - start
+            rssPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        finally:
+            shutil.rmtree(tmpDir , True)
+            gal.close()
+        stats = gal.stats()
+        lat = recorder.latencies
+        queue.put({
+            'workload': name ,
+            'seconds': elapsed ,
+            'units': units ,
+            'unit': unitName ,
+            'throughput': units / elapsed ,
+            'requests': stats['requests'] ,
+            'errors': stats['errors'] ,
+            'requestsPerSec': stats['requests'] / elapsed ,
+            'bytesSent': sum(e['bytesSent'] for e in
+                stats['endpoints'].values()) ,
+            'bytesReceived': sum(e['bytesReceived'] for e in
+                stats['endpoints'].values()) ,
+            'p50Ms': (_percentile(lat , 50) or 0) * 1000 ,
+            'p90Ms': (_percentile(lat , 90) or 0) * 1000 ,
+            'p99Ms': (_percentile(lat , 99) or 0) * 1000 ,
+            'peakRssKb': rssPeak ,
+            'rssGrowthKb': rssPeak - rssBefore ,
+            'endpoints': dict((k , e['count']) for k , e in
+                stats['endpoints'].items()) ,
+        })
+    except:
+        queue.put({'workload': name , 'error': traceback.format_exc()})
+
+def _serve(opts , queue):
+    server = FakeServer(**opts.serverArgs())
+    gal = server.gallery
+    urls = {'all': []}
+    for itemId in sorted(gal.items):
+        url = gal.itemUrl(itemId)
+        urls['all'].append(url)
+        urls.setdefault(gal.items[itemId]['type'] , []).append(url)
+    queue.put((server.host , server.port , urls))
+    server.serve_forever()
+
+def runWorkload(name , opts):
+    """
+    Runs a single workload against a new FakeServer and returns its results
+
+    name(str)           : One of WORKLOADS
+    opts(Options)       : The benchmark settings
+
+    returns(dict)       : The results.  If the workload failed, this has
+                          an "error" key with the traceback instead.
+    """
+    if name not in WORKLOADS:
+        raise ValueError('Unknown workload: %s' % name)
+    queue = Queue()
+    srvProc = Process(target=_serve , args=(opts , queue))
+    srvProc.daemon = True
+    srvProc.start()
+    try:
+        host , port , urls = queue.get(timeout=60)
+        proc = Process(target=_runInChild , args=(name , opts , host , port ,
+            urls , queue))
+        proc.start()
+        res = queue.get()
+        proc.join()
+    finally:
+        srvProc.terminate()
+        srvProc.join()
+    return res
+
+def runAll(opts , workloads=None , repeat=1):
+    """
+    Runs the workloads, keeping the best (highest throughput) of "repeat"
+    runs of each
+
+    returns(dict)       : "options" and "results", the dict of workload
+                          name to results
+    """
+    results = {}
+    for name in workloads or WORKLOADS:
+        best = None
+        for i in xrange(int(repeat)):
+            res = runWorkload(name , opts)
+            if 'error' in res:
+                best = res
+                break
+            if best is None or res['throughput'] > best['throughput']:
+                best = res
+        results[name] = best
+    return {'options': opts.asDict() , 'results': results}
+
+def compareResults(current , baseline , threshold=10.0):
+    """
+    Compares a run against a baseline run and returns the list of
+    regressions: a drop in throughput or a rise in p99 latency of more
+    than threshold percent, or a workload that failed
+
+    current(dict)       : The return value from runAll()
+    baseline(dict)      : A previous return value from runAll()
+    threshold(float)    : The allowed percentage change
+
+    returns(list[str])  : The descriptions of the regressions
+    """
+    regressions = []
+    for name , res in sorted(current['results'].items()):
+        if 'error' in res:
+            regressions.append('%s: failed' % name)
+            continue
+        base = baseline.get('results' , {}).get(name)
+        if not base or 'error' in base:
+            continue
+        limit = threshold / 100.0
+        if res['throughput'] < base['throughput'] * (1 - limit):
+            regressions.append('%s: throughput %.1f -> %.1f %s/s' % (name ,
+                base['throughput'] , res['throughput'] , res['unit']))
+        if res['p99Ms'] > base['p99Ms'] * (1 + limit):
+            regressions.append('%s: p99 %.2f -> %.2f ms' % (name ,
+                base['p99Ms'] , res['p99Ms']))
+    return regressions
+
+def formatResults(run):
+    """
+    Returns the results from runAll() as a text table
+    """
+    lines = ['%-12s %12s %10s %10s %8s %8s %8s %10s' % ('workload' ,
+        'throughput' , 'unit/s' , 'req/s' , 'p50 ms' , 'p90 ms' , 'p99 ms' ,
+        'peak KB')]
+    for name in WORKLOADS:
+        res = run['results'].get(name)
+        if res is None:
+            continue
+        if 'error' in res:
+            lines.append('%-12s FAILED\n%s' % (name , res['error']))
+            continue
+        lines.append('%-12s %12.1f %10s %10.1f %8.2f %8.2f %8.2f %10d' % (
+            name , res['throughput'] , res['unit'] , res['requestsPerSec'] ,
+            res['p50Ms'] , res['p90Ms'] , res['p99Ms'] , res['peakRssKb']))
+    return '\n'.join(lines)
@@ -0,0 +1,398 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+A small in-memory stand-in for the Gallery 3 REST API, good enough to
+drive libg3 for benchmarking.  It serves the item, items, data, tags, tag,
+item_tags, tag_item, item_comments, comments and comment resources over
+HTTP/1.1 keep-alive connections.  The gallery is a generated tree of
+albums and photos whose shape, payload sizes and response latency are
+configurable.
+"""
+
+__all__ = ['FakeGallery' , 'FakeServer' , 'REST_BASE']
+
+from BaseHTTPServer import BaseHTTPRequestHandler , HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import urlsplit , parse_qsl
+import threading , time , re , json
+
+REST_BASE = '/gallery3/index.php/rest'
+
+class FakeGallery(object):
+    """
+    The state of the fake gallery
+    """
+    def __init__(self , root , fanout=3 , depth=2 , photos=10 ,
+            photoSize=100000 , descSize=0):
+        """
+        root(str)           : The url of the REST root
+        fanout(int)         : The number of sub-albums in each album
+        depth(int)          : The number of levels of sub-albums
+        photos(int)         : The number of photos in each album
+        photoSize(int)      : The size of each photo in bytes.  Resizes are
+                              a quarter and thumbnails a hundredth of it.
+        descSize(int)       : The length of each item's description, to
+                              pad out the REST payloads
+        """
+        self.root = root
+        self.photoSize = int(photoSize)
+        self.desc = 'd' * int(descSize)
+        self.lock = threading.RLock()
+        self.items = {}
+        self.children = {}
+        self.data = {}
+        self.tags = {}
+        self.tagsByName = {}
+        self.itemTags = {}
+        self.comments = {}
+        self.itemComments = {}
+        self._nextId = 1
+        self._photoData = 'x' * self.photoSize
+        self._newItem('album' , None , 'root')
+        self._build(1 , int(depth) , int(fanout) , int(photos))
+
+    def itemUrl(self , itemId):
+        return '%s/item/%d' % (self.root , itemId)
+
+    def itemResp(self , itemId , types=None):
+        ent = dict(self.items[itemId])
+        if ent['parent']:
+            ent['parent'] = self.itemUrl(ent['parent'])
+        if ent['type'] != 'album':
+            for size in ('file' , 'thumb' , 'resize'):
+                ent['%s_url' % size] = '%s/data/%d?size=%s' % (self.root ,
+                    itemId , size)
+            ent['file_size'] = len(self.data[itemId])
+        kids = self.children[itemId]
+        if types:
+            kids = [k for k in kids if self.items[k]['type'] in types]
+        return {
+            'url': self.itemUrl(itemId) ,
+            'entity': ent ,
+            'members': [self.itemUrl(k) for k in kids] ,
+            'relationships': {
+                'tags': {
+                    'url': '%s/item_tags/%d' % (self.root , itemId) ,
+                    'members': ['%s/tag_item/%d,%d' % (self.root , t ,
+                        itemId) for t in self.itemTags[itemId]] ,
+                } ,
+                'comments': {
+                    'url': '%s/item_comments/%d' % (self.root , itemId) ,
+                } ,
+            } ,
+        }
+
+    def getData(self , itemId , size):
+        data = self.data[itemId]
+        if size == 'thumb':
+            return data[:max(1 , len(data) // 100)]
+        if size == 'resize':
+            return data[:max(1 , len(data) // 4)]
+        return data
+
+    def addItem(self , t , parentId , name , title='' , data=None):
+        itemId = self._newItem(t , parentId , name , data)
+        self.items[itemId]['title'] = title
+        return itemId
+
+    def deleteItem(self , itemId):
+        for kid in list(self.children.pop(itemId)):
+            self.deleteItem(kid)
+        parentId = self.items.pop(itemId)['parent']
+        if parentId in self.children:
+            self.children[parentId].remove(itemId)
+        self.data.pop(itemId , None)
+
+    def _newItem(self , t , parentId , name , data=None):
+        itemId = self._nextId
+        self._nextId += 1
+        self.items[itemId] = {
+            'id': itemId ,
+            'type': t ,
+            'name': name ,
+            'title': name.title() ,
+            'description': self.desc ,
+            'created': 1300000000 ,
+            'updated': 1300000000 ,
+            'parent': parentId ,
+            'can_edit': True ,
+            'album_cover': None ,
+        }
+        self.children[itemId] = []
+        if parentId:
+            self.children[parentId].append(itemId)
+        if t != 'album':
+            if data is None:
+                data = self._photoData
+            self.data[itemId] = data
+        self.itemTags[itemId] = []
+        self.itemComments[itemId] = []
+        return itemId
+
+    def _build(self , parentId , depth , fanout , photos):
+        for i in xrange(photos):
+            self._newItem('photo' , parentId , 'p%d_%d.jpg' % (parentId , i))
+        if depth <= 0:
+            return
+        for i in xrange(fanout):
+            albumId = self._newItem('album' , parentId , 'a%d_%d' % (
+                parentId , i))
+            self._build(albumId , depth - 1 , fanout , photos)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer the responses rather than writing each header separately
+    wbufsize = -1
+
+    def log_message(self , *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _send(self , code , body , ctype='application/json' , headers={}):
+        if not isinstance(body , str):
+            body = json.dumps(body)
+        self.send_response(code)
+        self.send_header('Content-Type' , ctype)
+        self.send_header('Content-Length' , str(len(body)))
+        for k , v in headers.items():
+            self.send_header(k , v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self , code , errors):
+        self._send(code , {'errors': errors})
+
+    def _handle(self):
+        srv = self.server
+        body = ''
+        if 'Content-Length' in self.headers:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+        if srv.latency:
+            time.sleep(srv.latency)
+        parts = urlsplit(self.path)
+        if not parts.path.startswith(REST_BASE):
+            return self._error(404 , {'path': 'not found'})
+        path = parts.path[len(REST_BASE):]
+        query = dict(parse_qsl(parts.query))
+        method = self.headers.get('X-Gallery-Request-Method' ,
+            self.command).lower()
+        entity = {}
+        ctype = self.headers.get('Content-Type' , '')
+        if body and ctype.startswith('application/x-www-form-urlencoded'):
+            form = dict(parse_qsl(body))
+            if 'entity' in form:
+                entity = json.loads(form['entity'])
+            else:
+                entity = form
+        with srv.gallery.lock:
+            self._route(srv.gallery , method , path , query , entity , body ,
+                ctype)
+
+    def _route(self , gal , method , path , query , entity , body , ctype):
+        types = query.get('type')
+        if types:
+            types = types.split(',')
+        m = re.match(r'^/item/(\d+)$' , path)
+        if m:
+            itemId = int(m.group(1))
+            if itemId not in gal.items:
+                return self._error(404 , {'item': 'missing'})
+            if method == 'get':
+                return self._send(200 , gal.itemResp(itemId , types))
+            if method == 'put':
+                ent = gal.items[itemId]
+                ent.update(entity)
+                ent['updated'] += 1
+                return self._send(200 , '')
+            if method == 'delete':
+                gal.deleteItem(itemId)
+                return self._send(200 , '')
+            if method == 'post':
+                if ctype.startswith('multipart/form-data'):
+                    entity , data = self._parseUpload(body , ctype)
+                else:
+                    data = None
+                newId = gal.addItem(entity['type'] , itemId ,
+                    entity['name'] , entity.get('title' , '') , data)
+                return self._send(201 , {'url': gal.itemUrl(newId)})
+        if path == '/items':
+            out = []
+            for url in json.loads(query['urls']):
+                itemId = int(url.rsplit('/' , 1)[1])
+                if itemId in gal.items and (not types or
+                        gal.items[itemId]['type'] in types):
+                    # Like Gallery 3, the type filter applies to the
+                    # members of the albums returned too
+                    out.append(gal.itemResp(itemId , types))
+            return self._send(200 , out)
+        m = re.match(r'^/data/(\d+)$' , path)
+        if m:
+            itemId = int(m.group(1))
+            if itemId not in gal.data:
+                return self._error(404 , {'item': 'missing'})
+            data = gal.getData(itemId , query.get('size'))
+            rng = self.headers.get('Range')
+            if rng:
+                start = int(re.match(r'bytes=(\d+)-' , rng).group(1))
+                return self._send(206 , data[start:] , 'image/jpeg' ,
+                    {'Content-Range': 'bytes %d-%d/%d' % (start ,
+                    len(data) - 1 , len(data))})
+            return self._send(200 , data , 'image/jpeg')
+        if path == '/tags':
+            if method == 'post':
+                name = entity['name']
+                if name not in gal.tagsByName:
+                    tagId = len(gal.tags) + 1
+                    gal.tags[tagId] = {'id': tagId , 'name': name ,
+                        'count': 0}
+                    gal.tagsByName[name] = tagId
+                return self._send(201 , {'url': '%s/tag/%d' % (gal.root ,
+                    gal.tagsByName[name])})
+            return self._send(200 , {
+                'url': '%s/tags' % gal.root ,
+                'members': ['%s/tag/%d' % (gal.root , t) for t in gal.tags] ,
+            })
+        m = re.match(r'^/tag/(\d+)$' , path)
+        if m:
+            tagId = int(m.group(1))
+            if tagId not in gal.tags:
+                return self._error(404 , {'tag': 'missing'})
+            return self._send(200 , {
+                'url': '%s/tag/%d' % (gal.root , tagId) ,
+                'entity': gal.tags[tagId] ,
+                'relationships': {'items': {
+                    'url': '%s/tag_items/%d' % (gal.root , tagId)}} ,
+            })
+        m = re.match(r'^/item_tags/(\d+)$' , path)
+        if m:
+            itemId = int(m.group(1))
+            if itemId not in gal.items:
+                return self._error(404 , {'item': 'missing'})
+            if method == 'post':
+                tagId = int(entity['tag'].rsplit('/' , 1)[1])
+                if tagId not in gal.tags:
+                    return self._error(400 , {'tag': 'invalid'})
+                if tagId not in gal.itemTags[itemId]:
+                    gal.itemTags[itemId].append(tagId)
+                    gal.tags[tagId]['count'] += 1
+                return self._send(201 , {'url': '%s/tag_item/%d,%d' % (
+                    gal.root , tagId , itemId)})
+            return self._send(200 , {
+                'url': '%s/item_tags/%d' % (gal.root , itemId) ,
+                'members': ['%s/tag_item/%d,%d' % (gal.root , t , itemId)
+                    for t in gal.itemTags[itemId]] ,
+            })
+        m = re.match(r'^/tag_item/(\d+),(\d+)$' , path)
+        if m:
+            tagId , itemId = int(m.group(1)) , int(m.group(2))
+            return self._send(200 , {
+                'url': '%s/tag_item/%d,%d' % (gal.root , tagId , itemId) ,
+                'entity': {
+                    'tag': '%s/tag/%d' % (gal.root , tagId) ,
+                    'item': gal.itemUrl(itemId) ,
+                } ,
+            })
+        m = re.match(r'^/item_comments/(\d+)$' , path)
+        if m:
+            itemId = int(m.group(1))
+            return self._send(200 , {
+                'url': '%s/item_comments/%d' % (gal.root , itemId) ,
+                'members': ['%s/comment/%d' % (gal.root , c) for c in
+                    gal.itemComments.get(itemId , [])] ,
+            })
+        if path == '/comments' and method == 'post':
+            commId = len(gal.comments) + 1
+            itemId = int(entity['item'].rsplit('/' , 1)[1])
+            gal.comments[commId] = {
+                'id': commId ,
+                'text': entity['text'] ,
+                'item': entity['item'] ,
+                'created': 1300000000 ,
+                'updated': 1300000000 ,
+                'state': 'published' ,
+            }
+            gal.itemComments[itemId].append(commId)
+            return self._send(201 , {'url': '%s/comment/%d' % (gal.root ,
+                commId)})
+        m = re.match(r'^/comment/(\d+)$' , path)
+        if m:
+            commId = int(m.group(1))
+            if commId not in gal.comments:
+                return self._error(404 , {'comment': 'missing'})
+            return self._send(200 , {
+                'url': '%s/comment/%d' % (gal.root , commId) ,
+                'entity': gal.comments[commId] ,
+            })
+        return self._error(404 , {'path': path})
+
+    def _parseUpload(self , body , ctype):
+        """
+        Returns the (entity , file data) from a multipart upload
+        """
+        boundary = '--%s' % ctype.split('boundary=' , 1)[1]
+        entity = data = None
+        for part in body.split(boundary)[1:-1]:
+            head , content = part.split('\r\n\r\n' , 1)
+            content = content[:-2]
+            if 'name="entity"' in head:
+                entity = json.loads(content)
+            elif 'name="file"' in head:
+                data = content
+        return (entity , data)
+
+class FakeServer(ThreadingMixIn , HTTPServer):
+    """
+    The threaded HTTP server for a FakeGallery.  Call start() to serve it
+    from a background thread, or serve_forever() to serve it from the
+    current one.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self , host='127.0.0.1' , port=0 , latency=0.0 ,
+            **galleryArgs):
+        """
+        host(str)           : The address to listen on (default: 127.0.0.1)
+        port(int)           : The port to listen on (default: any free port)
+        latency(float)      : The seconds to sleep before each response
+                              (default: 0)
+        galleryArgs         : Passed on to FakeGallery
+        """
+        HTTPServer.__init__(self , (host , int(port)) , _Handler)
+        self.latency = float(latency)
+        self.host , self.port = self.server_address[:2]
+        self.gallery = FakeGallery('http://%s:%d%s' % (self.host ,
+            self.port , REST_BASE) , **galleryArgs)
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+    def handle_error(self , request , clientAddress):
+        # Clients dropping keep-alive connections are expected
+        pass
@@ -0,0 +1,114 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+A micro-benchmark of the installed JsonCodec backends, decoding
+"rest/items" pages and encoding request entities like the ones the
+FakeServer sends and receives
+"""
+
+__all__ = ['makePage' , 'runCodecs' , 'formatCodecs']
+
+from FakeServer import FakeGallery , REST_BASE
+from libg3 import JsonCodec
+import time
+
+def makePage(items=25 , descSize=200):
+    """
+    Returns a "rest/items" response body of photos, as sent by the
+    FakeServer
+
+    items(int)          : The number of items in the page
+    descSize(int)       : The length of each item's description
+
+    returns(str)
+    """
+    gal = FakeGallery('http://127.0.0.1:8080%s' % REST_BASE , fanout=0 ,
+        depth=0 , photos=items , photoSize=1 , descSize=descSize)
+    page = [gal.itemResp(itemId) for itemId in sorted(gal.items)
+        if itemId != 1]
+    return JsonCodec.loadBackend('json')[1](page)
+
+def _time(func , arg , minTime):
+    """
+    Returns the best seconds per call over runs of at least minTime
+    """
+    best = None
+    for i in xrange(3):
+        n = 0
+        start = time.time()
+        while True:
+            func(arg)
+            n += 1
+            elapsed = time.time() - start
+            if elapsed >= minTime:
+                break
+        if best is None or elapsed / n < best:
+            best = elapsed / n
+    return best
+
+def runCodecs(items=25 , descSize=200 , minTime=0.2 , backends=None):
+    """
+    Times each backend decoding a page of items and encoding the entity of
+    a typical update
+
+    items(int)          : The number of items in the page
+    descSize(int)       : The length of each item's description
+    minTime(float)      : The minimum seconds to time each operation for
+    backends(list[str]) : The backends to time (default: all installed)
+
+    returns(dict)       : "items", "pageBytes" and "results", a dict of
+                          backend name to "decodeMs", "encodeMs" and
+                          "decodeMBps"
+    """
+    body = makePage(items , descSize)
+    entity = JsonCodec.loadBackend('json')[0](body)[0]['entity']
+    results = {}
+    for name in backends or JsonCodec.availableBackends():
+        loads , dumps = JsonCodec.loadBackend(name)
+        decode = _time(loads , body , minTime)
+        encode = _time(dumps , entity , minTime)
+        results[name] = {
+            'decodeMs': decode * 1000 ,
+            'encodeMs': encode * 1000 ,
+            'decodeMBps': len(body) / decode / 1e6 ,
+        }
+    return {'items': items , 'pageBytes': len(body) , 'results': results}
+
+def formatCodecs(run):
+    """
+    Returns the results from runCodecs() as a text table
+    """
+    lines = ['JSON codecs: %d item page, %d bytes (in use: %s)' % (
+        run['items'] , run['pageBytes'] , JsonCodec.getBackend()) ,
+        '%-12s %12s %12s %12s %10s' % ('backend' , 'decode ms' ,
+        'encode ms' , 'decode MB/s' , 'vs json')]
+    base = run['results'].get('json')
+    for name in JsonCodec.BACKENDS:
+        res = run['results'].get(name)
+        if res is None:
+            continue
+        speedup = ''
+        if base:
+            speedup = '%.2fx' % (base['decodeMs'] / res['decodeMs'])
+        lines.append('%-12s %12.3f %12.4f %12.1f %10s' % (name ,
+            res['decodeMs'] , res['encodeMs'] , res['decodeMBps'] ,
+            speedup))
+    return '\n'.join(lines)
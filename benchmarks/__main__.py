@@ -0,0 +1,126 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from optparse import OptionParser
+from Bench import WORKLOADS , Options , runAll , compareResults , \
+    formatResults
+from JsonBench import runCodecs , formatCodecs
+import sys , json
+
+def getOpts():
+    d = Options.defaults
+    usage = 'Usage: %prog [options] [workload ...]\n\nWorkloads: ' + \
+        ', '.join(WORKLOADS)
+    p = OptionParser(usage=usage , prog='python -m benchmarks')
+    p.add_option('-l' , '--latency' , dest='latency' , type='float' ,
+        default=d['latency'] , metavar='SECS' ,
+        help='The server latency per request [default: %default]')
+    p.add_option('-f' , '--fanout' , dest='fanout' , type='int' ,
+        default=d['fanout'] , metavar='NUM' ,
+        help='The number of sub-albums per album [default: %default]')
+    p.add_option('-d' , '--depth' , dest='depth' , type='int' ,
+        default=d['depth'] , metavar='NUM' ,
+        help='The number of levels of sub-albums [default: %default]')
+    p.add_option('-p' , '--photos' , dest='photos' , type='int' ,
+        default=d['photos'] , metavar='NUM' ,
+        help='The number of photos per album [default: %default]')
+    p.add_option('-s' , '--photo-size' , dest='photoSize' , type='int' ,
+        default=d['photoSize'] , metavar='BYTES' ,
+        help='The size of each photo [default: %default]')
+    p.add_option('--desc-size' , dest='descSize' , type='int' ,
+        default=d['descSize'] , metavar='BYTES' ,
+        help='The length of the item descriptions, to pad out the '
+        'REST payloads [default: %default]')
+    p.add_option('-c' , '--concurrency' , dest='concurrency' , type='int' ,
+        default=d['concurrency'] , metavar='NUM' ,
+        help='The client concurrency [default: %default]')
+    p.add_option('--pool-size' , dest='poolSize' , type='int' ,
+        default=d['poolSize'] , metavar='NUM' ,
+        help='The client connection pool size [default: %default]')
+    p.add_option('--uploads' , dest='uploads' , type='int' ,
+        default=d['uploads'] , metavar='NUM' ,
+        help='The number of images to upload [default: %default]')
+    p.add_option('--tag-items' , dest='tagItems' , type='int' ,
+        default=d['tagItems'] , metavar='NUM' ,
+        help='The number of items to tag [default: %default]')
+    p.add_option('--tags-per-item' , dest='tagsPerItem' , type='int' ,
+        default=d['tagsPerItem'] , metavar='NUM' ,
+        help='The number of tags to add to each item [default: %default]')
+    p.add_option('-r' , '--repeat' , dest='repeat' , type='int' ,
+        default=1 , metavar='NUM' ,
+        help='Run each workload NUM times and keep the best '
+        '[default: %default]')
+    p.add_option('-j' , '--json-codecs' , dest='jsonCodecs' ,
+        action='store_true' , default=False ,
+        help='Run the JSON codec micro-benchmark instead of the workloads')
+    p.add_option('--page-items' , dest='pageItems' , type='int' ,
+        default=25 , metavar='NUM' ,
+        help='The number of items in each page decoded by the JSON codec '
+        'benchmark [default: %default]')
+    p.add_option('-o' , '--output' , dest='output' , default=None ,
+        metavar='FILE' , help='Write the results as JSON to FILE')
+    p.add_option('-b' , '--baseline' , dest='baseline' , default=None ,
+        metavar='FILE' , help='Compare the results with the JSON results '
+        'in FILE and exit with 1 on a regression')
+    p.add_option('-t' , '--threshold' , dest='threshold' , type='float' ,
+        default=10.0 , metavar='PCT' ,
+        help='The percentage drop in throughput or rise in p99 latency '
+        'that counts as a regression [default: %default]')
+    opts , args = p.parse_args()
+    for name in args:
+        if name not in WORKLOADS:
+            p.error('Unknown workload: %s' % name)
+    return (opts , args)
+
+def main():
+    opts , workloads = getOpts()
+    if opts.jsonCodecs:
+        print formatCodecs(runCodecs(opts.pageItems , opts.descSize))
+        return 0
+    benchOpts = Options(**dict((k , getattr(opts , k)) for k in
+        Options.defaults))
+    run = runAll(benchOpts , workloads , opts.repeat)
+    print formatResults(run)
+    if opts.output:
+        fh = open(opts.output , 'w')
+        try:
+            json.dump(run , fh , indent=2 , sort_keys=True)
+        finally:
+            fh.close()
+    failed = [n for n , r in run['results'].items() if 'error' in r]
+    if opts.baseline:
+        fh = open(opts.baseline)
+        try:
+            baseline = json.load(fh)
+        finally:
+            fh.close()
+        regressions = compareResults(run , baseline , opts.threshold)
+        if regressions:
+            print '\nRegressions against %s:' % opts.baseline
+            for r in regressions:
+                print '    %s' % r
+            return 1
+    if failed:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
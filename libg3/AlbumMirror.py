@@ -0,0 +1,243 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['AlbumMirror']
+
+from Workers import parallelMap
+import os , threading
+import JsonCodec
+
+class AlbumMirror(object):
+    """
+    Mirrors an album subtree to a local directory.  Each album becomes a
+    directory and each image or movie a file named after the item.  A
+    manifest of the "updated" timestamp of every file that has been
+    downloaded is kept in the destination directory so that later syncs
+    only transfer the items that have changed.
+    """
+    manifestName = '.g3mirror.json'
+
+    def __init__(self , album , destDir , concurrency=4 , prune=False):
+        """
+        album(Album)        : The top of the album subtree to mirror
+        destDir(str)        : The local directory to mirror into
+        concurrency(int)    : The number of simultaneous requests used for
+                              both listing albums and downloading files
+                              (default: 4)
+        prune(bool)         : If True, local files for items that no longer
+                              exist in the gallery, the old copies of
+                              items that were renamed or moved and the
+                              directories of albums that are gone are
+                              removed on sync (default: False)
+        """
+        self.album = album
+        self.destDir = destDir
+        self.concurrency = int(concurrency)
+        self.prune = prune
+        self.manifestPath = os.path.join(destDir , self.manifestName)
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """
+        Brings the local mirror up to date.  Items that fail to download
+        are left out of the manifest so they are retried on the next sync.
+
+        returns(dict)       : A summary with the number of files
+                              "downloaded", "skipped" and "removed" and a
+                              list of (url , error) tuples for the items
+                              that "failed"
+        """
+        manifest = self._loadManifest()
+        self.album.refresh()
+        seen = set()
+        paths = set()
+        dirs = set()
+        toFetch = []
+        skipped = 0
+        for item , relPath in self._walk(dirs):
+            seen.add(item.url)
+            paths.add(relPath)
+            entry = manifest.get(item.url)
+            if entry is not None and entry['path'] == relPath and \
+                    entry['updated'] == str(item.updated) and \
+                    os.path.isfile(self._localPath(relPath)):
+                skipped += 1
+                continue
+            toFetch.append((item , relPath))
+        failed = []
+        moved = []
+
+        def fetch(job):
+            item , relPath = job
+            try:
+                self._download(item , relPath)
+            except Exception , e:
+                with self._lock:
+                    failed.append((item.url , e))
+                return
+            with self._lock:
+                old = manifest.get(item.url)
+                manifest[item.url] = {
+                    'path': relPath ,
+                    'updated': str(item.updated) ,
+                }
+            # A renamed or moved item leaves its old copy behind, unless
+            # another item has taken over that path
+            if self.prune and old is not None and old['path'] != relPath \
+                    and old['path'] not in paths:
+                if self._removeFile(old['path']):
+                    with self._lock:
+                        moved.append(item.url)
+
+        try:
+            parallelMap(fetch , toFetch , self.concurrency)
+        finally:
+            removed = len(moved)
+            if self.prune:
+                removed += self._prune(manifest , seen)
+                self._pruneDirs(dirs)
+            self._saveManifest(manifest)
+        return {
+            'downloaded': len(toFetch) - len(failed) ,
+            'skipped': skipped ,
+            'removed': removed ,
+            'failed': failed ,
+        }
+
+    def _walk(self , dirs):
+        """
+        Yields a (item , relPath) tuple for every image and movie below the
+        album, creating the local directories along the way and adding
+        them to dirs
+        """
+        relDirs = {self.album.url: ''}
+        self._makeDir('')
+        gal = self.album._gal
+        for item in gal.walk(self.album , concurrency=self.concurrency ,
+                refresh=True):
+            relPath = os.path.join(relDirs[item.parent.url] , 
+                self._safeName(item.name))
+            if item.type == 'album':
+                relDirs[item.url] = relPath
+                dirs.add(relPath)
+                self._makeDir(relPath)
+            elif item.type in ('photo' , 'movie'):
+                yield (item , relPath)
+
+    def _makeDir(self , relDir):
+        localDir = self._localPath(relDir)
+        if not os.path.isdir(localDir):
+            os.makedirs(localDir)
+
+    def _download(self , item , relPath):
+        """
+        Downloads the item to a version specific ".part" file, so an
+        interrupted download of the same version can be resumed, and
+        moves it into place when it completes
+        """
+        path = self._localPath(relPath)
+        partPath = '%s.%s.part' % (path , item.updated)
+        item.saveTo(partPath)
+        os.rename(partPath , path)
+        # Partial downloads of other versions are no use any more
+        self._removeParts(path)
+
+    def _prune(self , manifest , seen):
+        removed = 0
+        for url in manifest.keys():
+            if url in seen:
+                continue
+            if self._removeFile(manifest.pop(url)['path']):
+                removed += 1
+        return removed
+
+    def _pruneDirs(self , dirs):
+        """
+        Removes the directories of albums that are no longer in the 
+        gallery, along with any partial downloads left in them, once they
+        are empty
+        """
+        for root , subDirs , files in os.walk(self.destDir , topdown=False):
+            relDir = os.path.relpath(root , self.destDir)
+            if relDir == '.' or relDir in dirs:
+                continue
+            for f in files:
+                if f.endswith('.part'):
+                    os.remove(os.path.join(root , f))
+            try:
+                os.rmdir(root)
+            except OSError:
+                # Not empty
+                pass
+
+    def _removeFile(self , relPath):
+        path = self._localPath(relPath)
+        self._removeParts(path)
+        if os.path.isfile(path):
+            os.remove(path)
+            return True
+        return False
+
+    def _removeParts(self , path):
+        """
+        Removes the "<path>.<updated>.part" files for the path
+        """
+        dirName , base = os.path.split(path)
+        prefix = '%s.' % base
+        try:
+            names = os.listdir(dirName)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix) and name.endswith('.part') and \
+                    name[len(prefix):-5].isdigit():
+                try:
+                    os.remove(os.path.join(dirName , name))
+                except OSError:
+                    pass
+
+    def _localPath(self , relPath):
+        return os.path.join(self.destDir , relPath)
+
+    def _safeName(self , name):
+        name = os.path.basename(name.replace(os.sep , '_'))
+        if name in ('' , '.' , '..'):
+            name = '_%s' % name
+        return name
+
+    def _loadManifest(self):
+        if not os.path.isfile(self.manifestPath):
+            return {}
+        fh = open(self.manifestPath)
+        try:
+            return JsonCodec.loads(fh.read())
+        finally:
+            fh.close()
+
+    def _saveManifest(self , manifest):
+        if not os.path.isdir(self.destDir):
+            os.makedirs(self.destDir)
+        tmpPath = '%s.tmp' % self.manifestPath
+        fh = open(tmpPath , 'w')
+        try:
+            fh.write(JsonCodec.dumps(manifest))
+        finally:
+            fh.close()
+        os.rename(tmpPath , self.manifestPath)
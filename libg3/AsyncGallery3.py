@@ -0,0 +1,192 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['AsyncGallery3']
+
+from Workers import Executor
+
+class AsyncGallery3(object):
+    """
+    A non-blocking front end to a Gallery3 object.  Each of the calls is run
+    on a bounded pool of worker threads and immediately returns a Future
+    for its result:
+
+        agal = AsyncGallery3(gal , maxWorkers=32)
+        futures = [agal.getItemsForUrls(urls) for urls in batches]
+        for f in futures:
+            items = f.result()
+
+    The workers share the Gallery3's keep-alive connection pool and its
+    adaptive limiter, so its poolSize should be about maxWorkers for the
+    connections to be reused and for the limiter to start out letting all
+    the workers' requests through.
+    """
+    def __init__(self , gal , maxWorkers=16):
+        """
+        gal(Gallery3)       : The gallery object to make the calls with
+        maxWorkers(int)     : The maximum number of calls in flight at once
+                              (default: 16)
+        """
+        self.gal = gal
+        self._executor = Executor(maxWorkers)
+
+    def submit(self , func , *args , **kwargs):
+        """
+        Runs any blocking call, func(*args , **kwargs), on the worker pool
+
+        returns(Future)
+        """
+        return self._executor.submit(func , *args , **kwargs)
+
+    def close(self , wait=True):
+        """
+        Stops the worker threads once the pending calls have finished and
+        closes the gallery's idle connections
+
+        wait(bool)      : If True, wait for the pending calls to finish
+        """
+        self._executor.shutdown(wait)
+        self.gal.close()
+
+    def getRoot(self):
+        """
+        returns(Future[Album])  : The root album
+        """
+        return self.submit(self.gal.getRoot)
+
+    def getItemsForUrls(self , urls , parent=None , concurrency=None):
+        """
+        See Gallery3.getItemsForUrls()
+
+        returns(Future[list[BaseRemote]])
+        """
+        return self.submit(self.gal.getItemsForUrls , urls , parent ,
+            concurrency)
+
+    def addAlbum(self , parent , albumName , title , description='' ,
+            lazy=False):
+        """
+        See Gallery3.addAlbum()
+
+        returns(Future[Album])
+        """
+        return self.submit(self.gal.addAlbum , parent , albumName , title ,
+            description , lazy)
+
+    def addImage(self , parent , image , title='' , description='' , name='' ,
+            lazy=False):
+        """
+        See Gallery3.addImage()
+
+        returns(Future[RemoteImage])
+        """
+        return self.submit(self.gal.addImage , parent , image , title ,
+            description , name , lazy)
+
+    def addMovie(self , parent , movie , title='' , description='' , name='' ,
+            lazy=False):
+        """
+        See Gallery3.addMovie()
+
+        returns(Future[RemoteMovie])
+        """
+        return self.submit(self.gal.addMovie , parent , movie , title ,
+            description , name , lazy)
+
+    def updateItem(self , item):
+        """
+        See Gallery3.updateItem()
+
+        returns(Future[tuple(status , msg)])
+        """
+        return self.submit(self.gal.updateItem , item)
+
+    def deleteItem(self , item):
+        """
+        See Gallery3.deleteItem()
+
+        returns(Future[tuple(status , msg)])
+        """
+        return self.submit(self.gal.deleteItem , item)
+
+    def tagItem(self , item , tagName):
+        """
+        See Gallery3.tagItem()
+
+        returns(Future[Tag])
+        """
+        return self.submit(self.gal.tagItem , item , tagName)
+
+    def updateItems(self , items , concurrency=None):
+        """
+        See Gallery3.updateItems()
+
+        returns(Future[list[tuple(status , msg)]])
+        """
+        return self.submit(self.gal.updateItems , items , concurrency)
+
+    def deleteItems(self , items , concurrency=None):
+        """
+        See Gallery3.deleteItems()
+
+        returns(Future[list[tuple(status , msg)]])
+        """
+        return self.submit(self.gal.deleteItems , items , concurrency)
+
+    def tagItems(self , items , tagNames , concurrency=None):
+        """
+        See Gallery3.tagItems()
+
+        returns(Future[list[tuple(status , msg)]])
+        """
+        return self.submit(self.gal.tagItems , items , tagNames ,
+            concurrency)
+
+    def addComment(self , image , comment , lazy=False):
+        """
+        See Gallery3.addComment()
+
+        returns(Future[Comment])
+        """
+        return self.submit(self.gal.addComment , image , comment , lazy)
+
+    def loadMembers(self , item):
+        """
+        Loads the "members" of the item in the background
+
+        returns(Future[list[BaseRemote]])
+        """
+        return self.submit(getattr , item , 'members')
+
+    def loadTags(self , items , concurrency=None):
+        """
+        See Gallery3.loadTags()
+
+        returns(Future[list[list[Tag]]])
+        """
+        return self.submit(self.gal.loadTags , items , concurrency)
+
+    def loadComments(self , items , concurrency=None):
+        """
+        See Gallery3.loadComments()
+
+        returns(Future[list[list[Comment]]])
+        """
+        return self.submit(self.gal.loadComments , items , concurrency)
@@ -0,0 +1,300 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['ConnectionPool' , 'KeepAliveHandler' , 'KeepAliveHTTPSHandler']
+
+from urllib2 import HTTPHandler , HTTPSHandler , URLError
+from urllib import addinfourl
+import httplib , socket , select , threading , time
+
+# The methods which can be safely resent after the request went out.  The
+# Gallery 3 method (the X-Gallery-Request-Method) is checked for REST
+# requests, since they're all sent as GET or POST.
+_IDEMPOTENT = ('get' , 'head' , 'put' , 'delete')
+
+def _isIdempotent(req):
+    method = getattr(req , 'g3Method' , None) or req.get_method()
+    return method.lower() in _IDEMPOTENT
+
+def _isDropped(conn):
+    """
+    Returns True if the idle connection has been closed by the server.  An
+    idle keep-alive socket has nothing to read, so a readable one is at
+    EOF (or has junk on it) and can't be used.
+    """
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable = select.select([sock] , [] , [] , 0)[0]
+    except (select.error , socket.error , ValueError):
+        return True
+    return bool(readable)
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of idle HTTP/1.1 connections, keyed by
+    (protocol , host:port , tunnel host:port).  The tunnel host is None
+    unless the connection goes through an HTTPS proxy.
+    """
+    def __init__(self , maxSize=4 , idleTimeout=4):
+        """
+        maxSize(int)        : The maximum number of idle connections kept
+                              per (protocol , host:port) (default: 4)
+        idleTimeout(float)  : The number of seconds an idle connection is
+                              kept around before it is closed.  This should
+                              be below the server's keep-alive timeout (5
+                              seconds by default for Apache). (default: 4)
+        """
+        self.maxSize = int(maxSize)
+        self.idleTimeout = idleTimeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self , key):
+        """
+        Returns an idle connection for the key, or None if there isn't a
+        usable one.  Connections the server has closed are dropped.
+
+        key(tuple)      : The (protocol , host:port , tunnel) tuple
+
+        returns(httplib.HTTPConnection|None)
+        """
+        while True:
+            conn = None
+            with self._lock:
+                conns = self._idle.get(key , [])
+                stale = self._evict(conns)
+                if conns:
+                    # Take the most recently used connection, it's the 
+                    # least likely to have been dropped by the server
+                    conn = conns.pop()[0]
+            if conn is not None and _isDropped(conn):
+                stale.append(conn)
+                conn = None
+                self._closeAll(stale)
+                continue
+            self._closeAll(stale)
+            return conn
+
+    def put(self , key , conn):
+        """
+        Returns a connection to the pool.  If the pool for this key is full,
+        the connection is closed instead.
+
+        key(tuple)                      : The (protocol , host:port ,
+                                          tunnel) tuple
+        conn(httplib.HTTPConnection)    : The connection to return
+        """
+        with self._lock:
+            conns = self._idle.setdefault(key , [])
+            stale = self._evict(conns)
+            if len(conns) < self.maxSize:
+                conns.append((conn , time.time()))
+                conn = None
+        self._closeAll(stale)
+        if conn is not None:
+            conn.close()
+
+    def clear(self):
+        """
+        Closes all idle connections
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for conns in idle.values():
+            self._closeAll([c for c , t in conns])
+
+    def _evict(self , conns):
+        """
+        Removes the connections that have been idle too long from the list
+        and returns them.  This must be called with the lock held.
+        """
+        cutoff = time.time() - self.idleTimeout
+        i = 0
+        while i < len(conns) and conns[i][1] < cutoff:
+            i += 1
+        stale = [c for c , t in conns[:i]]
+        del conns[:i]
+        return stale
+
+    def _closeAll(self , conns):
+        for c in conns:
+            try:
+                c.close()
+            except:
+                pass
+
+class _PooledResponse(object):
+    """
+    Wraps an httplib.HTTPResponse and hands the connection back to the pool
+    once the response body has been completely read.  The body bytes read
+    are counted and passed to onDone once the body has been read or the
+    response closed.
+    """
+    def __init__(self , pool , key , conn , resp , onDone=None):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self._onDone = onDone
+        self._bytesRead = 0
+
+    def recv(self , amt=None):
+        if self._resp is None:
+            return ''
+        if amt is None:
+            data = self._resp.read()
+        else:
+            data = self._resp.read(amt)
+        self._bytesRead += len(data)
+        if self._resp.isclosed():
+            self._release()
+        return data
+    read = recv
+
+    def close(self):
+        if self._resp is None:
+            return
+        if self._resp.isclosed():
+            self._release()
+            return
+        # The body wasn't completely read so the connection can't be reused
+        self._resp.close()
+        self._conn.close()
+        self._resp = None
+        self._conn = None
+        self._done()
+
+    def _release(self):
+        resp , conn = self._resp , self._conn
+        self._resp = None
+        self._conn = None
+        if resp.will_close:
+            conn.close()
+        else:
+            self._pool.put(self._key , conn)
+        self._done()
+
+    def _done(self):
+        onDone , self._onDone = self._onDone , None
+        if onDone is not None:
+            try:
+                onDone(self._bytesRead)
+            except Exception:
+                pass
+
+class _KeepAliveMixin(object):
+    """
+    Implements the pooled equivalent of urllib2.AbstractHTTPHandler.do_open
+    """
+    def _poolOpen(self , connClass , req , **connArgs):
+        host = req.get_host()
+        if not host:
+            raise URLError('no host given')
+        # Set by urllib2.ProxyHandler for https through a proxy
+        tunnelHost = getattr(req , '_tunnel_host' , None)
+        key = (req.get_type() , host , tunnelHost)
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k , v) for k , v in req.headers.items()
+            if k not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((k.title() , v) for k , v in headers.items())
+        tunnelHeaders = {}
+        if tunnelHost and 'Proxy-Authorization' in headers:
+            # The proxy credentials go with the CONNECT, not the request
+            tunnelHeaders['Proxy-Authorization'] = \
+                headers.pop('Proxy-Authorization')
+        conn = self.pool.get(key)
+        if conn is not None:
+            if conn.sock is not None and \
+                    req.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                conn.sock.settimeout(req.timeout)
+            sent = False
+            try:
+                self._request(conn , req , headers)
+                sent = True
+                return self._getResponse(key , conn , req)
+            except socket.timeout , e:
+                # A timeout is the server being slow, not the connection
+                # going stale, so it mustn't be blindly resent
+                conn.close()
+                raise URLError(e)
+            except (socket.error , httplib.HTTPException) , e:
+                # The server most likely closed the idle connection on us,
+                # so we retry on a fresh one.  Once the whole request has
+                # gone out, though, the server may have acted on it, so
+                # only idempotent requests are resent.
+                conn.close()
+                if sent and not _isIdempotent(req):
+                    raise URLError(e)
+                if hasattr(req.data , 'seek'):
+                    req.data.seek(0)
+        conn = connClass(host , timeout=req.timeout , **connArgs)
+        if tunnelHost:
+            conn.set_tunnel(tunnelHost , headers=tunnelHeaders)
+        try:
+            self._request(conn , req , headers)
+            return self._getResponse(key , conn , req)
+        except (socket.error , httplib.HTTPException) , e:
+            conn.close()
+            raise URLError(e)
+
+    def _request(self , conn , req , headers):
+        conn.request(req.get_method() , req.get_selector() , req.data ,
+            headers)
+
+    def _getResponse(self , key , conn , req):
+        r = conn.getresponse(buffering=True)
+        fp = socket._fileobject(_PooledResponse(self.pool , key , conn , r ,
+            getattr(req , 'onBodyRead' , None)) , close=True)
+        resp = addinfourl(fp , r.msg , req.get_full_url())
+        resp.code = r.status
+        resp.msg = r.reason
+        return resp
+
+class KeepAliveHandler(_KeepAliveMixin , HTTPHandler):
+    """
+    A replacement for urllib2.HTTPHandler that reuses connections from a
+    ConnectionPool
+    """
+    def __init__(self , pool , debuglevel=0):
+        HTTPHandler.__init__(self , debuglevel)
+        self.pool = pool
+
+    def http_open(self , req):
+        return self._poolOpen(httplib.HTTPConnection , req)
+
+class KeepAliveHTTPSHandler(_KeepAliveMixin , HTTPSHandler):
+    """
+    A replacement for urllib2.HTTPSHandler that reuses connections from a
+    ConnectionPool
+    """
+    def __init__(self , pool , debuglevel=0 , context=None):
+        HTTPSHandler.__init__(self , debuglevel)
+        self.pool = pool
+        self._sslContext = context
+
+    def https_open(self , req):
+        connArgs = {}
+        if self._sslContext is not None:
+            connArgs['context'] = self._sslContext
+        return self._poolOpen(httplib.HTTPSConnection , req , **connArgs)
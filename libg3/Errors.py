@@ -19,7 +19,8 @@
 #
 
 __all__ = ['G3Error' , 'G3RequestError' , 'G3InvalidRespError' , 
-    'G3UnknownTypeError' , 'G3AuthError' , 'G3UnknownError']
+    'G3UnknownTypeError' , 'G3AuthError' , 'G3UnknownError' , 
+    'G3TimeoutError']
 
 class G3Error(Exception):
     pass
@@ -49,3 +50,6 @@ class G3AuthError(G3Error):
 
 class G3UnknownError(G3Error):
     pass
+
+class G3TimeoutError(G3Error):
+    pass
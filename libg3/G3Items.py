@@ -19,21 +19,78 @@
 #
 
 __all__ = ['Album' , 'Image' , 'LocalImage' , 'RemoteImage' , 'LocalMovie' , 
-    'RemoteMovie' , 'getItemFromResp' , 'getItemsFromResp']
+    'RemoteMovie' , 'getItemFromResp' , 'getItemsFromResp' , 
+    'getPartialItem']
 
+from Errors import G3Error , G3InvalidRespError , G3UnknownTypeError
 from datetime import datetime
 import weakref , types , os , mimetypes , re
-try:
-    import json
-except:
-    try:
-        import simplejson
-    except ImportError , e:
-        raise ImportError('You must have either the "json" or "simplejson"'
-            'library installed!')
-
+import JsonCodec
+
+# The attributes that get a slot of their own on the remote objects.  These
+# are the fields Gallery 3 sends for items, tags and comments plus the ones
+# set by this library.  Anything else the server sends ends up in the 
+# instance __dict__, which is only created when it's actually needed.
+_REMOTE_SLOTS = (
+    # The top level of the REST response
+    'url' , '_members' , 'relationships' ,
+    # Item entities
+    'id' , 'type' , 'name' , 'title' , 'description' , 'slug' , 'level' ,
+    'created' , 'updated' , 'captured' , 'owner_id' , 'mime_type' , 
+    'rand_key' , 'sort_column' , 'sort_order' , 'view_count' , 'view_1' ,
+    'view_2' , 'width' , 'height' , 'resize_width' , 'resize_height' ,
+    'thumb_width' , 'thumb_height' , 'file_size' , 'resize_size' , 
+    'thumb_size' , 'can_edit' , 'web_url' , 'file_url' , 'resize_url' , 
+    'thumb_url' , 'file_url_public' , 'resize_url_public' , 
+    'thumb_url_public' , '_album_cover' , 'album_cover' , '_parent' ,
+    # Tag entities
+    'count' ,
+    # Comment entities
+    'text' , 'state' , 'author_id' , 'guest_name' , 'guest_email' , 
+    'guest_url' , '_item' , 'item' ,
+    # Set by this library
+    '_weakGal' , '_weakParent' , 'fh' , 'members' , 'tags' , 'comments' ,
+    '_typeIndex' , '_stub' ,
+)
+
+# The fields of a partially built item which are kept over the values from
+# the server when it is hydrated, if they have been changed since the item
+# was built.  The values it was built with are only what was sent to the
+# server, which may have changed them (renaming on a conflict for example).
+_LOCAL_FIELDS = ('name' , 'title' , 'description')
+
+# Strings which are repeated across many items are stored once
+_INTERN_FIELDS = frozenset(('type' , 'mime_type' , 'sort_column' , 
+    'sort_order' , 'state'))
+
+def _compactStr(v , share=False):
+    """
+    Unicode strings take up to 4 bytes per character in python 2, so the
+    ascii ones (all the urls, for example) are stored as plain strings
+    """
+    if isinstance(v , unicode):
+        try:
+            v = v.encode('ascii')
+        except UnicodeError:
+            return v
+    if share and isinstance(v , str):
+        v = intern(v)
+    return v
+
+def _compactTree(v):
+    """
+    Applies _compactStr() to all the strings in nested dicts and lists
+    """
+    if isinstance(v , dict):
+        return dict((_compactStr(k , True) , _compactTree(val))
+            for k , val in v.iteritems())
+    if isinstance(v , list):
+        return [_compactTree(val) for val in v]
+    return _compactStr(v)
 
 class BaseRemote(object):
+    __slots__ = _REMOTE_SLOTS + ('__dict__' , '__weakref__')
+
     def __init__(self , respObj , weakGalObj , weakParent=None):
         self._setAttrItems(respObj.items())
         if 'entity' in respObj:
@@ -54,8 +111,8 @@ class BaseRemote(object):
 
     def __repr__(self):
         try:
-            return '%s : %s : %s' % (self.__dict__.get('id') , 
-                self.__dict__.get('type') , self.__dict__.get('name'))
+            return '%s : %s : %s' % (self._peek('id') , 
+                self._peek('type') , self._peek('name'))
         except:
             pass
         return type(self)
@@ -64,6 +121,16 @@ class BaseRemote(object):
         """
         A bit of magic to make the retrieval of member objects lazy
         """
+        # Process the weak reference calls
+        if name == '_gal':
+            return self._weakGal()
+        if name == 'parent' and self._weakParent is not None:
+            return self._weakParent()
+        # A partially built item fetches the rest of its fields the first
+        # time one of them is needed
+        if not name.startswith('__') and self._peek('_stub') is not None:
+            self._hydrate()
+            return getattr(self , name)
         # Process the specials
         if name == 'members':
             self.members = self._getMemberObjects()
@@ -74,11 +141,6 @@ class BaseRemote(object):
         if name == 'comments':
             self.comments = self._getComments()
             return self.comments
-        # Process the weak reference calls
-        if name == '_gal':
-            return self._weakGal()
-        if name == 'parent' and self._weakParent is not None:
-            return self._weakParent()
         # Process the generic items
         urlAttr = '_%s' % name
         # Call __getattribute__ to prevent loops
@@ -89,6 +151,77 @@ class BaseRemote(object):
             return obj
         raise AttributeError(name)
 
+    def _refresh(self , respObj , weakParent=None):
+        """
+        Updates this object in place from a new response for the same url.
+        Any lazily loaded objects that the new response makes stale are
+        dropped so they are reloaded on the next access.
+        """
+        oldMembers = self._peek('_members')
+        oldTags = (self._peek('relationships') or {}).get('tags')
+        local = []
+        built = self._peek('_stub')
+        if built is not None:
+            built = dict(built)
+            local = [(k , self._peek(k)) for k in _LOCAL_FIELDS 
+                if self._peek(k) is not None and 
+                self._peek(k) != built.get(k)]
+            if 'entity' in respObj:
+                # A stub may have been created without knowing its type
+                cls = _getItemClass(respObj)
+                if self.__class__ is not cls:
+                    self.__class__ = cls
+        self._setAttrItems(respObj.items())
+        if 'entity' in respObj:
+            self._setAttrItems(respObj['entity'].items())
+        for k , v in local:
+            setattr(self , k , v)
+        self._stub = None
+        if weakParent is not None:
+            self._weakParent = weakParent
+        if self._peek('_members') != oldMembers:
+            self._drop('members')
+            self._drop('_typeIndex')
+        if (self._peek('relationships') or {}).get('tags') != oldTags:
+            self._drop('tags')
+        self._postInit()
+
+    def _peek(self , name):
+        """
+        Returns the attribute if it is set, or None, without triggering any
+        lazy loading
+        """
+        try:
+            return object.__getattribute__(self , name)
+        except AttributeError:
+            return None
+
+    def _drop(self , name):
+        """
+        Removes the attribute if it is set
+        """
+        try:
+            object.__delattr__(self , name)
+        except AttributeError:
+            pass
+
+    def refresh(self):
+        """
+        Fetches this item from the server again and updates it in place.
+        Any cached response for it is dropped first, so this always asks
+        the server.
+        """
+        self._gal._invalidate(self.url)
+        resp = self._gal.getRespFromUrl(self.url)
+        getItemFromResp(resp , self._gal)
+
+    def _hydrate(self):
+        """
+        Fetches the full entity for a partially built item, along with
+        those of the other pending stubs
+        """
+        self._gal._hydrateStubs(self)
+
     def _postInit(self):
         """
         This can be overridden in subclasses to do any special initialization
@@ -101,8 +234,15 @@ class BaseRemote(object):
             if k == 'entity':
                 # Skip it
                 continue
+            if k in ('members' , 'relationships'):
+                v = _compactTree(v)
+            else:
+                v = _compactStr(v , k in _INTERN_FIELDS)
             if (type(v) in types.StringTypes and v.startswith('http') and 
                     'url' not in k) or k == 'members':
+                if k != 'members' and self._peek('_%s' % k) != v:
+                    # Drop the object previously loaded from the old url
+                    self._drop(k)
                 setattr(self , '_%s' % k , v)
             else:
                 setattr(self , k , v)
@@ -122,18 +262,21 @@ class BaseRemote(object):
 
         returns(list[Tag])
         """
+        return self._gal.getResourcesForUrls(self._getTagUrls() , self)
+
+    def _getTagUrls(self):
+        """
+        Returns the urls of the tags on this item
+
+        returns(list[str])
+        """
         # First, I want just the actual tag itself, not the RESTy "tag_item",
         # so I'm going to modify the urls to save a step
-        ret = []
         urls = []
         for url in self.relationships['tags']['members']:
             m = re.match('^(.*?/tag)_item(/\d+),\d+$' , url)
             urls.append('%s%s' % tuple(m.groups()))
-        if urls:
-            for url in urls:
-                resp = self._gal.getRespFromUrl(url)
-                ret.append(getItemFromResp(resp , self._gal , self))
-        return ret
+        return urls
 
     def _getComments(self):
         """
@@ -141,24 +284,30 @@ class BaseRemote(object):
         
         returns(list[Comment])  : Returns a list of Comment objects
         """
-        ret = []
-        # I can't use the shortcut I did for tags so I need to get the list
-        # of comments in the first call and then create the objects with
-        # the calls thereafter
+        return self._gal.getResourcesForUrls(self._getCommentUrls() , self)
+
+    def _getCommentUrls(self):
+        """
+        Returns the urls of the comments on this item.  I can't use the
+        shortcut I did for tags so this requires fetching the list of 
+        comments.
+
+        returns(list[str])
+        """
         commListUrl = self.relationships['comments']['url']
         resp = self._gal.getRespFromUrl(commListUrl)
-        tmpObj = json.loads(resp.read())
-        for url in tmpObj['members']:
-            resp = self._gal.getRespFromUrl(url)
-            ret.append(getItemFromResp(resp , self._gal , self))
-        return ret
+        return JsonCodec.loads(resp.read())['members']
         
     def _getUrlObject(self , url):
         """
-        This returns the album cover image
+        This returns the object for a url attribute, like the album cover 
+        image
         """
-        resp = self._gal.getRespFromUrl(url)
-        return getItemFromResp(resp , self._gal , self)
+        item = self._gal._getKnownItem(url)
+        if item is not None:
+            return item
+        # The item is only fetched once something is read from it
+        return self._gal.getStub(url)
 
     def getCrDT(self):
         """
@@ -212,39 +361,87 @@ class BaseRemote(object):
         return self._gal.tagItem(self , tagName)
 
 class Album(BaseRemote):
-    def addImage(self , image , title='' , description='' , name=''):
+    __slots__ = ()
+
+    def addImage(self , image , title='' , description='' , name='' ,
+            lazy=False):
         """
         Add a LocalImage object to the album
 
         image(LocalImage)       : The image to upload
+        lazy(bool)              : See Gallery3.addImage()
 
         returns(RemoteImage)    : The RemoteImage object that was created
         """
         if not isinstance(image , LocalImage):
             raise TypeError('%r is not of type LocalImage' % image)
-        return self._gal.addImage(self , image , title , description , name)
+        return self._gal.addImage(self , image , title , description , name ,
+            lazy)
 
-    def addMovie(self , movie , name='' , title='' , description=''):
+    def addMovie(self , movie , name='' , title='' , description='' ,
+            lazy=False):
         """
         Adds a LocalMovie object to the album
         
         movie(LocalMovie)       : The movie to upload
+        lazy(bool)              : See Gallery3.addImage()
 
         returns(RemoteMovie)    : The RemoteMovie object that was created
         """
-        return self._gal.addMovie(self , movie , title , description , name)
+        return self._gal.addMovie(self , movie , title , description , name ,
+            lazy)
 
-    def addAlbum(self , albumName , title , description=''):
+    def addImages(self , images , concurrency=None , callback=None ,
+            lazy=False):
+        """
+        Uploads several LocalImages to the album in parallel.  See
+        Gallery3.addImages() for the callback arguments.
+
+        images(iter[LocalImage])    : The images to upload
+        concurrency(int)            : The number of simultaneous uploads
+        callback(callable)          : Called as each upload finishes
+        lazy(bool)                  : See Gallery3.addImage()
+
+        returns(list[RemoteImage])  : The RemoteImage objects that were 
+                                      created, in order
+        """
+        images = list(images)
+        for image in images:
+            if not isinstance(image , LocalImage):
+                raise TypeError('%r is not of type LocalImage' % image)
+        return self._gal.addImages(self , images , concurrency , callback ,
+            lazy)
+
+    def addMovies(self , movies , concurrency=None , callback=None ,
+            lazy=False):
+        """
+        Uploads several LocalMovies to the album in parallel.  See
+        Gallery3.addImages() for the callback arguments.
+
+        movies(iter[LocalMovie])    : The movies to upload
+        concurrency(int)            : The number of simultaneous uploads
+        callback(callable)          : Called as each upload finishes
+        lazy(bool)                  : See Gallery3.addImage()
+
+        returns(list[RemoteMovie])  : The RemoteMovie objects that were 
+                                      created, in order
+        """
+        return self._gal.addMovies(self , movies , concurrency , callback ,
+            lazy)
+
+    def addAlbum(self , albumName , title , description='' , lazy=False):
         """
         Add a subalbum to this album
 
         albumName(str)  : The name of the new album
         title(str)      : The album title
         description(str): The album description
+        lazy(bool)      : See Gallery3.addAlbum()
 
         returns(Album)  : The Album object that was created
         """
-        return self._gal.addAlbum(self , albumName , title , description)
+        return self._gal.addAlbum(self , albumName , title , description ,
+            lazy)
 
     def setCover(self , image):
         """
@@ -284,6 +481,37 @@ class Album(BaseRemote):
         return self._getByType('movie')
     Movies = property(getMovies)
 
+    def iterMembers(self , batchSize=25 , type=None):
+        """
+        A generator that yields the members of this album one batch at a
+        time, as each batch is fetched.  Unlike the "members" attribute, 
+        the members are not all loaded up front or kept on the album, so
+        memory use stays bounded and stopping early skips the remaining 
+        requests.
+
+        batchSize(int)          : The number of members to fetch per batch
+                                  (default: 25)
+        type(str|list[str])     : Only yield members of this entity type 
+                                  or types.  The urls of those members are
+                                  requested from the server first.
+                                  (default: all types)
+
+        returns(generator[BaseRemote])
+        """
+        wanted = None
+        if type is not None:
+            wanted = [type] if isinstance(type , types.StringTypes) \
+                else list(type)
+        batchSize = int(batchSize)
+        memberUrls = self._members
+        if wanted:
+            memberUrls = self._gal.getMemberUrls(self , wanted)
+        for start in xrange(0 , len(memberUrls) , batchSize):
+            urls = memberUrls[start:start + batchSize]
+            for item in self._gal.getItemsForUrls(urls , self , 
+                    types=wanted):
+                yield item
+
     def getRandomImage(self , direct=True):
         """
         Returns a random RemoteImage object for the album.  If "direct" is
@@ -296,14 +524,60 @@ class Album(BaseRemote):
         """
         return self._gal.getRandomImage(self , direct)
 
+    def _getMemberObjects(self):
+        """
+        Loads all the members and indexes them by type
+        """
+        memObjs = BaseRemote._getMemberObjects(self)
+        index = {'album': [] , 'photo': [] , 'movie': []}
+        for m in memObjs:
+            index.setdefault(m.type , []).append(m)
+        self._typeIndex = index
+        return memObjs
+
+    def _addMember(self , url , item):
+        """
+        Records a newly created member of this album
+        """
+        self._members.append(url)
+        index = self._peek('_typeIndex')
+        if index is not None and item.type in index:
+            index[item.type].append(item)
+
+    def _removeMember(self , url):
+        """
+        Forgets a deleted member of this album
+        """
+        if url in self._members:
+            self._members.remove(url)
+        lists = (self._peek('_typeIndex') or {}).values()
+        if self._peek('members') is not None:
+            lists.append(self.members)
+        for objs in lists:
+            objs[:] = [o for o in objs if o.url != url]
+
     def _getByType(self , t):
-        ret = []
-        for m in self.members:
-            if m.type == t:
-                ret.append(m)
-        return ret
+        """
+        Returns the members of type t.  If all the members haven't been 
+        loaded, only the members of that type are requested from the 
+        server.  Either way, the results are indexed by type so later 
+        calls don't need to look at the members again.
+        """
+        index = self._peek('_typeIndex')
+        if index is None:
+            if self._peek('members') is not None:
+                # The members were loaded some other way, index them
+                self._getMemberObjects()
+                index = self._typeIndex
+            else:
+                index = self._typeIndex = {}
+        if t not in index:
+            urls = self._gal.getMemberUrls(self , [t])
+            index[t] = self._gal.getItemsForUrls(urls , self , types=[t])
+        return list(index[t])
 
 class Image(object):
+    __slots__ = ()
     contentType = ''
 
 class LocalImage(Image):
@@ -326,8 +600,9 @@ class LocalImage(Image):
     def setContentType(self , ctype=None):
         if ctype is not None:
             self.contentType = ctype
-        self.contentType = mimetypes.guess_type(self.getFileContents())[0] or \
-            'application/octet-stream'
+        else:
+            self.contentType = mimetypes.guess_type(self.path)[0] or \
+                'application/octet-stream'
     def getContentType(self):
         if not self.contentType:
             self.setContentType()
@@ -353,9 +628,9 @@ class LocalImage(Image):
         self.fh.seek(0)
         return self.fh.read()
 
-    def getUploadContent(self):
+    def getUploadHeaders(self):
         """
-        This will return a string containing the MIME headers and the actual
+        This will return a string containing the MIME headers for the
         binary content to be uploaded
         """
         ret = 'Content-Disposition: form-data; name="file"; '
@@ -363,9 +638,15 @@ class LocalImage(Image):
         ret += 'Content-Type: %s\r\n' % self.ContentType
         ret += 'Content-Transfer-Encoding: binary\r\n'
         ret += '\r\n'
-        ret += self.getFileContents() + '\r\n'
         return ret
 
+    def getUploadContent(self):
+        """
+        This will return a string containing the MIME headers and the actual
+        binary content to be uploaded
+        """
+        return self.getUploadHeaders() + self.getFileContents() + '\r\n'
+
     def close(self):
         try:
             self.fh.close()
@@ -373,15 +654,18 @@ class LocalImage(Image):
             pass
 
 class RemoteImage(BaseRemote , Image):
-    def addComment(self , comment):
+    __slots__ = ()
+
+    def addComment(self , comment , lazy=False):
         """
         Comment on this item with the string "comment"
 
         comment(str)        : The comment
+        lazy(bool)          : See Gallery3.addComment()
 
         returns(Comment)        : The comment that was created
         """
-        return self._gal.addComment(self , comment)
+        return self._gal.addComment(self , comment , lazy)
 
     def read(self , length=None):
         if not self.fh:
@@ -397,30 +681,101 @@ class RemoteImage(BaseRemote , Image):
         except:
             pass
 
+    def saveTo(self , dest , chunkSize=65536 , resume=True):
+        """
+        Streams the full size file to a local file a chunk at a time.  If
+        dest is a path to a partially downloaded copy and resume is True,
+        only the rest of the file is requested using an HTTP Range request.
+        If the server doesn't honor the range, the file is downloaded from 
+        the beginning.
+
+        dest(str|file)      : The path to save to or a file-like object
+                              opened for writing
+        chunkSize(int)      : The number of bytes to read and write at a 
+                              time (default: 65536)
+        resume(bool)        : If True, resume a partial download at the
+                              end of the existing file (default: True)
+
+        returns(int)        : The size of the downloaded file
+        """
+        if not isinstance(dest , types.StringTypes):
+            resp = self._gal.getRespFromUrl(self.file_url)
+            return self._copyResp(resp , dest , chunkSize)
+        offset = 0
+        if resume and os.path.isfile(dest):
+            offset = os.path.getsize(dest)
+        size = getattr(self , 'file_size' , None)
+        if size is not None:
+            size = int(size)
+            if offset == size:
+                # Already complete
+                return size
+            if offset > size:
+                offset = 0
+        headers = {}
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+        resp = self._gal.getRespFromUrl(self.file_url , headers)
+        if offset and self._getRangeStart(resp) != offset:
+            offset = 0
+        fh = open(dest , ('wb' , 'ab')[bool(offset)])
+        try:
+            return offset + self._copyResp(resp , fh , chunkSize)
+        finally:
+            fh.close()
+
+    def _copyResp(self , resp , fh , chunkSize):
+        total = 0
+        try:
+            while True:
+                data = resp.read(chunkSize)
+                if not data:
+                    break
+                fh.write(data)
+                total += len(data)
+        finally:
+            resp.close()
+        return total
+
+    def _getRangeStart(self , resp):
+        """
+        Returns the starting byte offset of a partial (206) response, or
+        None if the response contains the entire file
+        """
+        if resp.code != 206:
+            return None
+        m = re.match(r'^bytes\s+(\d+)-' , 
+            resp.info().getheader('Content-Range' , ''))
+        if m is None:
+            return None
+        return int(m.group(1))
+
     def getResizeHandle(self):
         """
         Returns a file-like object (specifically a urllib2.addinfourl) handle 
-        to the "resize" version of the image
+        to the "resize" version of the image.  This comes from the gallery's
+        imageCache, if it has one.
         
         returns(urllib2.addinfourl) : A file-like object handle for retrieving
                                       the resized image
         """
         if hasattr(self , 'resize_url'):
-            resp = self._gal.getRespFromUrl(self.resize_url)
-            return resp
+            return self._gal.getImageResp(self.resize_url , 
+                getattr(self , 'updated' , None))
         return None
 
     def getThumbHandle(self):
         """
         Returns a file-like object (specifically a urllib2.addinfourl) handle 
-        to the "thumbnail" version of the image
+        to the "thumbnail" version of the image.  This comes from the 
+        gallery's imageCache, if it has one.
         
         returns(urllib2.addinfourl) : A file-like object handle for retrieving
                                       the thumbnail image
         """
         if hasattr(self , 'thumb_url'):
-            resp = self._gal.getRespFromUrl(self.thumb_url)
-            return resp
+            return self._gal.getImageResp(self.thumb_url , 
+                getattr(self , 'updated' , None))
         return None
 
 class LocalMovie(LocalImage):
@@ -429,12 +784,14 @@ class LocalMovie(LocalImage):
         self.type = 'movie'
 
 class RemoteMovie(RemoteImage):
-    pass
+    __slots__ = ()
 
 class Tag(BaseRemote):
     """
     A simple class to represent a tag
     """
+    __slots__ = ()
+
     def __str__(self):
         return self.name
 
@@ -450,6 +807,8 @@ class Comment(BaseRemote):
     """
     A class to represent a comment
     """
+    __slots__ = ()
+
     def __str__(self):
         return self.text
 
@@ -476,34 +835,93 @@ def getItemFromResp(response , galObj , parent=None):
 
     returns(BaseRemote)         : Returns an implemenation of BaseRemote
     """
-    galObj = weakref.ref(galObj)
+    weakGal = weakref.ref(galObj)
     if parent is not None:
         parent = weakref.ref(parent)
     if isinstance(response , dict):
         respObj = response
     else:
-        respObj = json.loads(response.read())
+        respObj = JsonCodec.loads(response.read())
+    # Return the object we already have for this url, if there is one
+    item = galObj._getKnownItem(respObj.get('url'))
+    if item is not None:
+        item._refresh(respObj , parent)
+        return item
+    newItem = _newItem(respObj , weakGal , parent , response)
+    item = galObj._rememberItem(newItem)
+    if item is not newItem:
+        # Another thread got there first
+        item._refresh(respObj , parent)
+    return item
+
+def _newItem(respObj , weakGal , parent , response):
+    return _getItemClass(respObj , response)(respObj , weakGal , parent)
+
+def _getItemClass(respObj , response=None):
+    """
+    Returns the BaseRemote subclass for the response
+    """
     if 'count' in respObj['entity']:
         # This is a tag.  It doesn't have the same items as regular objects
-        return Tag(respObj , galObj , parent)
+        return Tag
     if 'text' in respObj['entity']:
         # This is a comment.  It also does not have the same items as
         # regular objects
-        return Comment(respObj , galObj , parent)
+        return Comment
     try:
         t = respObj['entity']['type']
     except:
         raise G3InvalidRespError('Response contains no "entity type": %r' % 
-            response)
+            (response or respObj))
     if t == 'album':
-        return Album(respObj , galObj , parent)
+        return Album
     elif t == 'photo':
-        return RemoteImage(respObj , galObj , parent)
+        return RemoteImage
     elif t == 'movie':
-        return RemoteMovie(respObj , galObj , parent)
+        return RemoteMovie
     else:
         raise G3UnknownTypeError('Unknown entity type: %s' % t)
 
+def getPartialItem(url , entity , galObj , parent=None):
+    """
+    Returns an item built from the fields that are already known for it,
+    without making a request.  The rest of the fields are fetched the
+    first time one of them is read.  The item's id is taken from its url.
+
+    url(str)                    : The url of the item
+    entity(dict)                : The known entity fields.  If there are
+                                  any, they must include "type" for
+                                  albums, photos and movies, or "text" for
+                                  comments.  With none, a plain BaseRemote
+                                  is returned which becomes the right type
+                                  when it is hydrated.
+    galObj(Gallery3)            : The gallery object this is associated with
+    parent(BaseRemote)          : The parent object for this item
+
+    returns(BaseRemote)         : Returns an implemenation of BaseRemote
+    """
+    item = galObj._getKnownItem(url)
+    if item is not None:
+        return item
+    entity = dict(entity)
+    cls = BaseRemote
+    if entity:
+        cls = _getItemClass({'entity': entity})
+    itemId = url.rstrip('/').rsplit('/' , 1)[-1]
+    if itemId.isdigit():
+        entity.setdefault('id' , int(itemId))
+    if parent is not None:
+        entity.setdefault('parent' , parent.url)
+        parent = weakref.ref(parent)
+    respObj = {'url': url , 'entity': entity}
+    newItem = cls(respObj , weakref.ref(galObj) , parent)
+    # The values built with, to tell which have been changed since
+    newItem._stub = tuple((k , newItem._peek(k)) for k in _LOCAL_FIELDS)
+    item = galObj._rememberItem(newItem)
+    if item is newItem:
+        galObj._addPendingStub(item)
+    return item
+
 def getItemsFromResp(response , galObj , parent=None):
     """
     This takes the raw response with a list of items and returns a list of
@@ -518,7 +936,7 @@ def getItemsFromResp(response , galObj , parent=None):
     returns(list[BaseRemote])   : Returns a list of BaseRemote objects
     """
     ret = []
-    lResp = json.loads(response.read())
+    lResp = JsonCodec.loads(response.read())
     if not isinstance(lResp , list):
         lResp = list(lResp)
     for resp in lResp:
@@ -21,37 +21,78 @@
 __all__ = ['Gallery3' , 'login']
 
 from Requests import *
-from Errors import G3RequestError , G3UnknownError
-from G3Items import getItemFromResp , getItemsFromResp , BaseRemote , Album , \
+from Errors import G3Error , G3RequestError , G3UnknownError , G3AuthError
+from ConnPool import ConnectionPool , KeepAliveHandler , KeepAliveHTTPSHandler
+from Workers import parallelMap , parallelImap
+from Stats import RequestInfo , StatsCollector
+from Retry import RetryPolicy , AdaptiveLimiter , OVERLOAD_STATUSES , isTimeout
+from G3Items import getItemFromResp , getItemsFromResp , getPartialItem , \
+    BaseRemote , Album , \
     RemoteImage , Tag
-from urllib import quote , urlencode
+from urllib import quote , urlencode , addinfourl
 from uuid import uuid4
-import urllib2 , os
-try:
-    import json
-except:
-    try:
-        import simplejson
-    except ImportError , e:
-        raise ImportError('You must have either the "json" or "simplejson"'
-            'library installed!')
+from cStringIO import StringIO
+import urllib2 , os , threading , mimetools , time , weakref , socket
+import JsonCodec
+
+class _Retryable(Exception):
+    """
+    Raised by Gallery3._openOnce() for a failed request which should be
+    retried
+    """
+    def __init__(self , retryAfter=None):
+        Exception.__init__(self)
+        self.retryAfter = retryAfter
 
 class Gallery3(object):
     """
     This is the main utility class that should be instantiated and used for all
     calls
     """
+    # The most stubs hydrated together, one "items" request's worth
+    stubBatchSize = 25
+
     def __init__(self , host , apiKey , g3Base='/gallery3' , port=80 , 
-            ssl=False):
+            ssl=False , poolSize=4 , idleTimeout=4 , concurrency=1 ,
+            cache=None , timeout=None , retryPolicy=None , limiter=None ,
+            imageCache=None):
         """
         Initializes and sets up the gallery 3 object
 
-        host(str)   : The hostname of the gallery site
-        apiKey(str) : The api key to use for the connections
-        g3Base(str) : The remote url path to your gallery 3 install
-                      (default: /gallery3)
-        port(int)   : The port number to connect to (default: 80)
-        ssl(bool)   : If true, use SSL for the connection (default: 80)
+        host(str)           : The hostname of the gallery site
+        apiKey(str)         : The api key to use for the connections
+        g3Base(str)         : The remote url path to your gallery 3 install
+                              (default: /gallery3)
+        port(int)           : The port number to connect to (default: 80)
+        ssl(bool)           : If true, use SSL for the connection 
+                              (default: 80)
+        poolSize(int)       : The maximum number of idle keep-alive 
+                              connections to hold on to (default: 4)
+        idleTimeout(float)  : The number of seconds before an idle 
+                              connection is closed.  Keep it below the
+                              server's keep-alive timeout. (default: 4)
+        concurrency(int)    : The default number of simultaneous requests
+                              used when fetching batches of items 
+                              (default: 1)
+        cache(BaseCache)    : A MemoryCache or DiskCache to cache the REST
+                              GET responses for plain resource urls,
+                              without a query string, in (default: None)
+        timeout(float)      : The socket timeout in seconds for the
+                              requests (default: the global default)
+        retryPolicy(RetryPolicy)    : Decides which failed requests are
+                                      retried and when (default: 
+                                      RetryPolicy()).  Pass False to never
+                                      retry.
+        limiter(AdaptiveLimiter)    : Limits the requests in flight from
+                                      all the threads using this object
+                                      (default: an AdaptiveLimiter
+                                      starting at max(poolSize , 
+                                      concurrency)).  Pass False for no
+                                      limit.
+        imageCache(ImageCache)  : A cache for the thumbnail and resize
+                                  images returned by
+                                  RemoteImage.getThumbHandle() and
+                                  getResizeHandle() (default: None)
         """
         self.host = host
         self.apiKey = apiKey
@@ -59,10 +100,32 @@ class Gallery3(object):
         self.ssl = ssl
         self.g3Base = g3Base.strip('/')
         self.protocol = ('http' , 'https')[ssl]
+        self.concurrency = int(concurrency)
+        self.cache = cache
+        self.imageCache = imageCache
+        self.timeout = timeout
+        if retryPolicy is None:
+            retryPolicy = RetryPolicy()
+        self.retryPolicy = retryPolicy or None
+        if limiter is None:
+            limiter = AdaptiveLimiter(max(int(poolSize) , self.concurrency))
+        self.limiter = limiter or None
         self.root = None
+        # The identity map of url -> remote object
+        self._items = weakref.WeakValueDictionary()
+        self._itemsLock = threading.Lock()
+        # The stubs which haven't been hydrated yet, url -> stub
+        self._pendingStubs = weakref.WeakValueDictionary()
+        # The tag name -> tag url cache and the tag objects loaded for it
+        self._tagUrls = {}
+        self._tagObjects = {}
+        self._tagLock = threading.Lock()
         self._rootUri = 'index.php/rest/item/1'
         self._opener = None
+        self._pool = ConnectionPool(poolSize , idleTimeout)
         self._buildOpener()
+        self.statsCollector = StatsCollector()
+        self._observers = [self.statsCollector]
 
     def getRoot(self):
         """
@@ -92,48 +155,299 @@ class Gallery3(object):
         }
         url = '%s?%s' % (album.url , urlencode(data))
         resp = self.getRespFromUrl(url)
-        # We get an album item back with a single member image
-        images = getItemFromResp(resp , self).Images
+        # We get an album back with a single member image.  That's not the
+        # real album, so we just want the member url from it.
+        urls = JsonCodec.loads(resp.read())['members']
+        images = self.getItemsForUrls(urls , album , types=['photo'])
         if not images:
             return None
         
         return images[0]
 
-    def getItemsForUrls(self , urls , parent=None):
+    def getMemberUrls(self , album , types=None):
+        """
+        Returns the urls for the members of the album.  If types are given,
+        the server is asked for only the members of those types.
+
+        album(Album)        : The album to get the member urls for
+        types(list[str])    : The entity types ("album", "photo", "movie")
+                              to return the urls for (default: all)
+
+        returns(list[str])  : The member urls
         """
-        This retrieves an item for each url specified in the urls list
+        if not types:
+            return list(album._members)
+        url = '%s?%s' % (album.url , urlencode({'type': ','.join(types)}))
+        resp = self.getRespFromUrl(url)
+        return JsonCodec.loads(resp.read())['members']
+
+    def getItemsForUrls(self , urls , parent=None , concurrency=None ,
+            refresh=False , types=None):
+        """
+        This retrieves an item for each url specified in the urls list.
+        Items that have already been loaded are returned as is, without
+        asking the server, unless refresh is True.
 
         urls(list[str])     : The list of urls to retrieve
+        parent(Album)       : The parent object for the items
+        concurrency(int)    : The number of chunks of urls to fetch 
+                              simultaneously (default: self.concurrency)
+        refresh(bool)       : If True, all the items are fetched and the
+                              ones already loaded are updated in place
+                              (default: False)
+        types(list[str])    : If set, only the items of these entity types
+                              ("album", "photo", "movie") are returned.  The
+                              filtering is done here rather than by the
+                              server, since the server would also filter
+                              the members of each album returned, which
+                              would then replace the full members of the
+                              shared album objects.
 
         returns(list[BaseRemote])   : Returns a list of the corresponding 
-                                      remote objects
+                                      remote objects, in the same order as
+                                      the urls
         """
-        numUrls = len(urls)
-        start = 0
+        if concurrency is None:
+            concurrency = self.concurrency
+        known = {}
+        if not refresh:
+            for url in urls:
+                item = self._getKnownItem(url)
+                if item is not None and (not types or item.type in types):
+                    if parent is not None:
+                        item._weakParent = weakref.ref(parent)
+                    known[url] = item
+        toFetch = [url for url in urls if url not in known]
+        if types:
+            # Skip the known items that were filtered out above
+            toFetch = [url for url in toFetch 
+                if self._getKnownItem(url) is None]
         increment = 25
-        ret = []
-        while start < numUrls:
+        starts = range(0 , len(toFetch) , increment)
+
+        def getChunk(start):
             data = {
-                'urls': json.dumps(urls[start:start+increment]) ,
+                'urls': JsonCodec.dumps(toFetch[start:start+increment]) ,
                 'num': str(increment) ,
                 'start': str(start) ,
             }
             resp = self.getRespFromUri('index.php/rest/items' , data)
-            ret.extend(getItemsFromResp(resp , self , parent))
-            start += increment
+            items = getItemsFromResp(resp , self , parent)
+            if types:
+                items = [item for item in items if item.type in types]
+            return items
+
+        fetched = []
+        for items in parallelMap(getChunk , starts , concurrency):
+            fetched.extend(items)
+        if not known:
+            return fetched
+        # The server leaves out items we can't see, so match them back up
+        # by url rather than position
+        for item in fetched:
+            known[item.url] = item
+        return [known[url] for url in urls if url in known]
+
+    def getStub(self , url , parent=None):
+        """
+        Returns an object for the url without making a request.  The first
+        time anything but its url is read from it, it is fetched together
+        with up to stubBatchSize - 1 of the other stubs that haven't been
+        fetched yet, in a single "items" request, and becomes an Album,
+        RemoteImage, etc., as appropriate.  If the item has already been 
+        loaded, that object is returned instead.
+
+        url(str)            : The url of the item
+        parent(Album)       : The parent object for the item
+
+        returns(BaseRemote)
+        """
+        return getPartialItem(url , {} , self , parent)
+
+    def getStubs(self , urls , parent=None):
+        """
+        Returns a stub for each of the urls.  See getStub().
+
+        urls(list[str])     : The urls of the items
+        parent(Album)       : The parent object for the items
+
+        returns(list[BaseRemote])
+        """
+        return [self.getStub(url , parent) for url in urls]
+
+    def walk(self , album , maxDepth=None , types=None , concurrency=None ,
+            refresh=False):
+        """
+        A generator that walks the album tree below "album" breadth first,
+        level by level.  The member batches for all of the albums on a 
+        level are fetched in parallel and the items are yielded as each 
+        batch arrives, so the order within a level is not fixed.  Each 
+        item's "parent" is the album it was found in.
+
+        album(Album)        : The album to start at.  It is not yielded 
+                              itself.
+        maxDepth(int)       : How many levels to descend.  1 yields only
+                              the album's own members. (default: no limit)
+        types(list[str])    : Only yield items of these entity types, 
+                              e.g. ['photo' , 'movie'].  Albums are still
+                              descended into. (default: all types)
+        concurrency(int)    : The number of simultaneous requests
+                              (default: self.concurrency)
+        refresh(bool)       : If True, items that are already loaded are
+                              fetched again and updated in place
+                              (default: False)
+
+        returns(generator[BaseRemote])
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        increment = 25
+        frontier = [album]
+        depth = 0
+        while frontier and (maxDepth is None or depth < maxDepth):
+            depth += 1
+            fetchTypes = types
+            if types and 'album' not in types and \
+                    (maxDepth is None or depth < maxDepth):
+                # We still need the albums to descend into
+                fetchTypes = list(types) + ['album']
+            jobs = []
+            for a in frontier:
+                for start in xrange(0 , len(a._members) , increment):
+                    jobs.append((a , a._members[start:start + increment]))
+
+            def getBatch(job):
+                parent , urls = job
+                return self.getItemsForUrls(urls , parent , 1 , refresh ,
+                    fetchTypes)
+
+            frontier = []
+            for items in parallelImap(getBatch , jobs , concurrency):
+                for item in items:
+                    if item.type == 'album':
+                        frontier.append(item)
+                    if not types or item.type in types:
+                        yield item
+
+    def getResourcesForUrls(self , urls , parent=None , concurrency=None):
+        """
+        This retrieves an object for each url in the list of urls, one 
+        request per url.  This is for the resources, like tags and 
+        comments, which the batched "items" resource can't return.  Objects
+        that have already been loaded are returned without a request.
+
+        urls(list[str])     : The list of urls to retrieve
+        parent(BaseRemote)  : The parent object for the new objects
+        concurrency(int)    : The number of simultaneous requests
+                              (default: self.concurrency)
+
+        returns(list[BaseRemote])   : The objects, in the same order as the
+                                      urls
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+
+        def getOne(url):
+            item = self._getKnownItem(url)
+            if item is not None:
+                return item
+            return getItemFromResp(self.getRespFromUrl(url) , self , parent)
+
+        return parallelMap(getOne , urls , concurrency)
+
+    def loadTags(self , items , concurrency=None):
+        """
+        Loads the tags for all the items at once.  Each distinct tag is 
+        only fetched once, no matter how many of the items it is on, and
+        the "tags" attribute of each of the items is set.
+
+        items(iter[BaseRemote])     : The items to load the tags for
+        concurrency(int)            : The number of simultaneous requests
+                                      (default: self.concurrency)
+
+        returns(list[list[Tag]])    : The tags for each of the items, in
+                                      order
+        """
+        items = list(items)
+        itemUrls = [item._getTagUrls() for item in items]
+        uniqUrls = []
+        seen = set()
+        for urls in itemUrls:
+            for url in urls:
+                if url not in seen:
+                    seen.add(url)
+                    uniqUrls.append(url)
+        tags = dict(zip(uniqUrls , 
+            self.getResourcesForUrls(uniqUrls , concurrency=concurrency)))
+        ret = []
+        for item , urls in zip(items , itemUrls):
+            item.tags = [tags[url] for url in urls]
+            ret.append(item.tags)
         return ret
-        
-    def getRespFromUrl(self , url):
+
+    def loadComments(self , items , concurrency=None):
+        """
+        Loads the comments for all the items at once.  The comment lists
+        for all the items are fetched in parallel, followed by all of the
+        comments, and the "comments" attribute of each item is set.
+
+        items(iter[BaseRemote])         : The items to load the comments 
+                                          for
+        concurrency(int)                : The number of simultaneous 
+                                          requests (default: 
+                                          self.concurrency)
+
+        returns(list[list[Comment]])    : The comments for each of the 
+                                          items, in order
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        items = list(items)
+        itemUrls = parallelMap(lambda item: item._getCommentUrls() , items , 
+            concurrency)
+        jobs = []
+        for item , urls in zip(items , itemUrls):
+            jobs.extend([(url , item) for url in urls])
+
+        def getOne(job):
+            url , item = job
+            return self.getResourcesForUrls([url] , item , 1)[0]
+
+        comments = iter(parallelMap(getOne , jobs , concurrency))
+        ret = []
+        for item , urls in zip(items , itemUrls):
+            item.comments = [comments.next() for url in urls]
+            ret.append(item.comments)
+        return ret
+
+    def getRespFromUrl(self , url , headers={}):
         """
         This returns the response object given a full url rather than just a
         uri defining the location on the server
 
-        url(str) : The url to the resource
+        url(str)        : The url to the resource
+        headers(dict)   : Any extra headers to send with the request
         """
-        req = GetRequest(url , self.apiKey)
+        if self.cache is not None and not headers and \
+                self._isCacheable(url):
+            return self._getCachedResp(url)
+        req = GetRequest(url , self.apiKey , headers=headers)
         resp = self._openReq(req)
         return resp
 
+    def getImageResp(self , url , updated=None):
+        """
+        Returns the response for a thumbnail or resize image, from the 
+        imageCache if there is one
+
+        url(str)        : The url of the image
+        updated(int)    : The "updated" time of the item.  Without it, the
+                          image is not cached.
+        """
+        if self.imageCache is None or updated is None:
+            return self.getRespFromUrl(url)
+        return self.imageCache.getHandle(url , updated , self.getRespFromUrl)
+
     def getRespFromUri(self , uri , kwargs={}):
         """
         Performs the request for the given uri and returns the "addinfourl" 
@@ -144,7 +458,8 @@ class Gallery3(object):
         url = self._buildUrl(uri , kwargs)
         return self.getRespFromUrl(url)
 
-    def addAlbum(self , parent , albumName , title , description=''):
+    def addAlbum(self , parent , albumName , title , description='' ,
+            lazy=False):
         """
         Adds an album to the given parent album
 
@@ -152,6 +467,10 @@ class Gallery3(object):
         albumName(str)      : The name of the album
         title(str)          : The album title
         description(str)    : The album description
+        lazy(bool)          : If True, the Album is built from the fields
+                              sent to create it rather than fetched, and
+                              the rest of its fields are fetched the first
+                              time one of them is read (default: False)
 
         returns(Album)      : The Album object that was created
         """
@@ -166,14 +485,16 @@ class Gallery3(object):
         }
         req = PostRequest(parent.url , self.apiKey , data)
         resp = self._openReq(req)
+        self._invalidate(parent.url)
         newObjUrl = self._getUrlFromResp(resp)
-        item = getItemFromResp(self.getRespFromUrl(newObjUrl) , self , parent)
-        parent._members.append(newObjUrl)
+        item = self._getCreatedItem(newObjUrl , data , parent , lazy)
+        parent._addMember(newObjUrl , item)
         # This appears to cause a race 
         #parent.members.append(item)
         return item
 
-    def addImage(self , parent , image , title='' , description='' , name=''):
+    def addImage(self , parent , image , title='' , description='' , name='' ,
+            lazy=False):
         """
         Add a LocalImage to the parent album.
 
@@ -183,6 +504,11 @@ class Gallery3(object):
         title(str)              : The image title
         description(str)        : The image description
         name(str)               : The image file name
+        lazy(bool)              : If True, the RemoteImage is built from the
+                                  fields sent to create it, saving a
+                                  request, and the rest of its fields are
+                                  fetched the first time one of them is 
+                                  read (default: False)
 
         returns(RemoteImage)    : The RemoteImage instance for the item
                                   uploaded
@@ -203,26 +529,33 @@ class Gallery3(object):
             boundary}
         # this is more complicated than adding an album.  We have to
         # construct the upload MIME headers, including build the string
-        # data section
+        # data section.  The file itself is streamed from disk when the
+        # request is sent.
         data = '--%s\r\n' % boundary
         data += 'Content-Disposition: form-data; name="entity"\r\n'
         data += 'Content-Type: text/plain; ' \
             'charset=UTF-8\r\n'
         data += 'Content-Transfer-Encoding: 8bit\r\n'
         data += '\r\n'
-        data += '%s\r\n' % json.dumps(entity , separators=(',' , ':'))
+        data += '%s\r\n' % JsonCodec.dumps(entity)
         data += '--%s\r\n' % boundary
-        data += image.getUploadContent()
-        data += '--%s--\r\n' % boundary
-        req = PostRequest(parent.url , self.apiKey , data , headers)
-        resp = self._openReq(req)
+        data += image.getUploadHeaders()
+        fh = open(image.path , 'rb')
+        try:
+            body = StreamBody([data , fh , '\r\n--%s--\r\n' % boundary])
+            req = PostRequest(parent.url , self.apiKey , body , headers)
+            resp = self._openReq(req)
+        finally:
+            fh.close()
+        self._invalidate(parent.url)
         newObjUrl = self._getUrlFromResp(resp)
-        item = getItemFromResp(self.getRespFromUrl(newObjUrl) , self , parent)
-        parent._members.append(newObjUrl)
+        item = self._getCreatedItem(newObjUrl , entity , parent , lazy)
+        parent._addMember(newObjUrl , item)
         #parent.members.append(item)
         return item
 
-    def addMovie(self , parent , movie , title='' , description='' , name=''):
+    def addMovie(self , parent , movie , title='' , description='' , name='' ,
+            lazy=False):
         """
         Add a LocalMovie to the parent album.
 
@@ -232,11 +565,81 @@ class Gallery3(object):
         title(str)              : The movie title
         description(str)        : The movie description
         name(str)               : The movie file name
+        lazy(bool)              : See addImage()
 
         returns(RemoteMovie)    : The RemoteMovie instance for the movie 
                                   uploaded
         """
-        return self.addImage(parent , movie , title , description , name)
+        return self.addImage(parent , movie , title , description , name ,
+            lazy)
+
+    def addImages(self , parent , images , concurrency=None , callback=None ,
+            lazy=False):
+        """
+        Uploads each of the LocalImages to the parent album, running up to
+        "concurrency" uploads at a time.
+
+        If a callback is given, it is called as each upload finishes with
+        the number of uploads done so far, the total number of uploads, 
+        the LocalImage, the resulting RemoteImage (None on failure) and the
+        exception raised for the upload (None on success):
+            
+            callback(numDone , total , image , item , error)
+
+        Failed uploads are then reported only through the callback and 
+        have None in the returned list.  Without a callback, the first 
+        failure is raised once the running uploads have finished.
+
+        parent(Album)               : The parent album to add the images to
+        images(iter[LocalImage])    : The local images to upload
+        concurrency(int)            : The number of simultaneous uploads
+                                      (default: self.concurrency)
+        callback(callable)          : The progress callback
+        lazy(bool)                  : See addImage().  Each upload is then
+                                      a single request.
+
+        returns(list[RemoteImage])  : The RemoteImage instances, in the 
+                                      same order as the images
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        images = list(images)
+        total = len(images)
+        progress = {'done': 0}
+        lock = threading.Lock()
+
+        def upload(image):
+            if callback is None:
+                return self.addImage(parent , image , lazy=lazy)
+            item = error = None
+            try:
+                item = self.addImage(parent , image , lazy=lazy)
+            except Exception , e:
+                error = e
+            with lock:
+                progress['done'] += 1
+                callback(progress['done'] , total , image , item , error)
+            return item
+
+        return parallelMap(upload , images , concurrency)
+
+    def addMovies(self , parent , movies , concurrency=None , callback=None ,
+            lazy=False):
+        """
+        Uploads each of the LocalMovies to the parent album.  See 
+        addImages() for the details.
+
+        parent(Album)               : The parent album to add the movies to
+        movies(iter[LocalMovie])    : The local movies to upload
+        concurrency(int)            : The number of simultaneous uploads
+                                      (default: self.concurrency)
+        callback(callable)          : The progress callback
+        lazy(bool)                  : See addImage()
+
+        returns(list[RemoteMovie])  : The RemoteMovie instances, in the 
+                                      same order as the movies
+        """
+        return self.addImages(parent , movies , concurrency , callback , lazy)
 
     def setAlbumCover(self , album , image):
         """
@@ -261,9 +664,10 @@ class Gallery3(object):
         }
         req = PutRequest(album.url , self.apiKey , data)
         try:
-            resp = self._openReq(req)
+            self._openReq(req).read()
         except G3RequestError , e:
             return (False , str(e))
+        self._invalidate(album.url)
         album.album_cover = image
         album._album_cover = image.url
         return (True , '')
@@ -290,11 +694,28 @@ class Gallery3(object):
         }
         req = PutRequest(item.url , self.apiKey , data)
         try:
-            resp = self._openReq(req)
+            self._openReq(req).read()
         except G3RequestError , e:
             return (False , str(e))
+        self._invalidate(item.url)
         return (True , '')
 
+    def updateItems(self , items , concurrency=None):
+        """
+        Updates the title and description of each of the items, running up
+        to "concurrency" requests at a time.  A failure for one item,
+        including not having permission to edit it, doesn't stop the
+        others and is reported in its result.
+
+        items(iter[BaseRemote])     : The items to update
+        concurrency(int)            : The number of simultaneous requests
+                                      (default: self.concurrency)
+
+        returns(list[tuple(status , msg)])  : The result for each of the
+                                              items, in order
+        """
+        return self._bulk(self.updateItem , items , concurrency)
+
     def updateAlbum(self , album):
         """
         Update the title and description for an album.
@@ -349,11 +770,35 @@ class Gallery3(object):
             return (False , e.message)
         req = DeleteRequest(item.url , self.apiKey)
         try:
-            resp = self._openReq(req)
+            self._openReq(req).read()
         except G3RequestError , e:
             return (False , e.message)
+        parentUrl = item._peek('_parent')
+        self._invalidate(item.url , parentUrl)
+        parent = self._getKnownItem(parentUrl)
+        with self._itemsLock:
+            if self._items.get(item.url) is item:
+                del self._items[item.url]
+            if isinstance(parent , Album):
+                parent._removeMember(item.url)
         return (True , '')
 
+    def deleteItems(self , items , concurrency=None):
+        """
+        Deletes each of the items, running up to "concurrency" requests at
+        a time.  A failure for one item, including not having permission
+        to delete it, doesn't stop the others and is reported in its
+        result.
+
+        items(iter[BaseRemote])     : The items to delete
+        concurrency(int)            : The number of simultaneous requests
+                                      (default: self.concurrency)
+
+        returns(list[tuple(status , msg)])  : The result for each of the
+                                              items, in order
+        """
+        return self._bulk(self.deleteItem , items , concurrency)
+
     def tagItem(self , item , tagName):
         """
         Tag this item with the string "tagName"
@@ -362,36 +807,97 @@ class Gallery3(object):
 
         returns(Tag)        : The tag that was created
         """
-        # First we have to create the tag itself, if necessary
-        data = {
-            'name': str(tagName) ,
-        }
-        url = self._buildUrl('index.php/rest/tags')
-        req = PostRequest(url , self.apiKey , data)
-        resp = self._openReq(req)
-        r = json.loads(resp.read())
-        tagUrl = r['url']
-        # And now that we have our (possibly) newly created tag, we can
-        # use that to tag our item
-        data = {
-            'tag': tagUrl ,
-            'item': item.url ,
-        }
-        url = self._buildUrl('index.php/rest/item_tags/%s' % item.id)
-        req = PostRequest(url , self.apiKey , data)
-        resp = self._openReq(req)
-        respObj = json.loads(resp.read())
-        item.relationships['tags']['members'].append(respObj['url'])
-        tag = Tag(respObj , self , item)
-        if hasattr(item , 'tags'):
-            item.tags.append(tag)
+        tagUrl , tagItemUrl = self._tagItemByName(item , tagName)
+        tag = self._getTag(tagUrl)
+        self._recordItemTag(item , tagItemUrl , tag)
         return tag
 
-    def addComment(self , image , comment):
+    def tagItems(self , items , tagNames , concurrency=None):
+        """
+        Tags each of the items with each of the tag names, running up to
+        "concurrency" requests at a time.  Each tag is only created, or
+        looked up, once.  A failure for one item doesn't stop the others
+        and is reported in its result.
+
+        items(iter[BaseRemote])     : The items to tag
+        tagNames(str|list[str])     : The tag name or names
+        concurrency(int)            : The number of simultaneous requests
+                                      (default: self.concurrency)
+
+        returns(list[tuple(status , msg)])  : The result for each of the
+                                              items, in order
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        if isinstance(tagNames , basestring):
+            tagNames = [tagNames]
+        items = list(items)
+        # Resolve the names up front so each is only created once
+        parallelMap(self._getTagUrl , tagNames , concurrency)
+        jobs = [(item , name) for item in items for name in tagNames]
+
+        def tagOne(job):
+            try:
+                return (True , self._tagItemByName(*job))
+            except Exception , e:
+                return (False , str(e))
+
+        results = parallelMap(tagOne , jobs , concurrency)
+        # Only fetch the tag objects if some item's tags are loaded
+        needTags = [i for i in items if i._peek('tags') is not None]
+        results = iter(results)
+        ret = []
+        for item in items:
+            status , msg = (True , '')
+            for name in tagNames:
+                ok , val = results.next()
+                if ok:
+                    tagUrl , tagItemUrl = val
+                    tag = None
+                    if needTags:
+                        tag = self._getTag(tagUrl)
+                    self._recordItemTag(item , tagItemUrl , tag)
+                elif status:
+                    status , msg = (False , val)
+            ret.append((status , msg))
+        return ret
+
+    def warmTagCache(self , concurrency=None):
+        """
+        Loads all the tags on the server into the tag name cache, so that
+        tagging with an existing tag never needs a request to look it up
+
+        concurrency(int)    : The number of simultaneous requests
+                              (default: self.concurrency)
+
+        returns(list[Tag])  : All the tags
+        """
+        resp = self.getRespFromUri('index.php/rest/tags')
+        urls = JsonCodec.loads(resp.read())['members']
+        tags = self.getResourcesForUrls(urls , concurrency=concurrency)
+        with self._tagLock:
+            for tag in tags:
+                self._tagUrls[self._getTagKey(tag.name)] = tag.url
+                self._tagObjects[tag.url] = tag
+        return tags
+
+    def clearTagCache(self):
+        """
+        Empties the tag name cache
+        """
+        with self._tagLock:
+            self._tagUrls = {}
+            self._tagObjects = {}
+
+    def addComment(self , image , comment , lazy=False):
         """
         Comment on this item with the string "comment"
 
         comment(str)        : The comment
+        lazy(bool)          : If True, the Comment is built from the fields
+                              sent to create it rather than fetched, and
+                              the rest of its fields are fetched the first
+                              time one of them is read (default: False)
 
         returns(Comment)        : The comment that was created
         """
@@ -402,18 +908,60 @@ class Gallery3(object):
         url = self._buildUrl('index.php/rest/comments')
         req = PostRequest(url , self.apiKey , data)
         resp = self._openReq(req)
-        commUrl = json.loads(resp.read())['url']
-        resp = self.getRespFromUrl(commUrl)
-        comm = getItemFromResp(resp , self , image)
-        if hasattr(image , 'comments'):
-            image.comments.append(comm)
+        commUrl = JsonCodec.loads(resp.read())['url']
+        self._invalidate(image.url , 
+            image.relationships['comments']['url'])
+        comm = self._getCreatedItem(commUrl , data , image , lazy)
+        comments = image._peek('comments')
+        if comments is not None:
+            comments.append(comm)
         return comm
 
+    def addObserver(self , observer):
+        """
+        Registers an observer to be called around every request.  See
+        Stats.RequestObserver for the interface.
+
+        observer(RequestObserver)   : The observer to add
+        """
+        self._observers = self._observers + [observer]
+
+    def removeObserver(self , observer):
+        """
+        Unregisters an observer added with addObserver()
+
+        observer(RequestObserver)   : The observer to remove
+        """
+        self._observers = [o for o in self._observers if o is not observer]
+
+    def stats(self):
+        """
+        Returns a snapshot of the request stats gathered by the built in
+        StatsCollector.  See StatsCollector.snapshot() for the format.
+        If there is a limiter, its current "limit" and "inFlight" count
+        are added under "limiter".
+
+        returns(dict)
+        """
+        ret = self.statsCollector.snapshot()
+        if self.limiter is not None:
+            ret['limiter'] = {
+                'limit': self.limiter.limit ,
+                'inFlight': self.limiter.inFlight ,
+            }
+        return ret
+
+    def close(self):
+        """
+        Closes all the idle keep-alive connections.  The connections will
+        be reopened as needed if this object is used after this is called.
+        """
+        self._pool.clear()
+
     def _buildOpener(self):
         cp = urllib2.HTTPCookieProcessor()
-        self._opener = urllib2.build_opener(cp)
-        if self.ssl:
-            self._opener.add_handler(urllib2.HTTPSHandler())
+        self._opener = urllib2.build_opener(cp , KeepAliveHandler(self._pool) ,
+            KeepAliveHTTPSHandler(self._pool))
 
     def _buildUrl(self , resource , kwargs={}):
         url = '%s://%s:%d/%s/%s' % (self.protocol , self.host , self.port , 
@@ -422,27 +970,340 @@ class Gallery3(object):
             url += '?%s' % urlencode(kwargs)
         return url
 
+    def _bulk(self , func , items , concurrency):
+        """
+        Calls func on each of the items in parallel, turning any exception
+        into a (False , msg) result
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+
+        def callOne(item):
+            try:
+                return func(item)
+            except Exception , e:
+                return (False , str(e))
+
+        return parallelMap(callOne , items , concurrency)
+
+    def _getTagUrl(self , tagName):
+        """
+        Returns the url of the tag with the name, from the tag cache or by
+        creating the tag (which returns the existing tag if there is one)
+        """
+        tagName = self._getTagKey(tagName)
+        tagUrl = self._tagUrls.get(tagName)
+        if tagUrl is not None:
+            return tagUrl
+        data = {
+            'name': tagName ,
+        }
+        url = self._buildUrl('index.php/rest/tags')
+        req = PostRequest(url , self.apiKey , data)
+        resp = self._openReq(req)
+        tagUrl = JsonCodec.loads(resp.read())['url']
+        with self._tagLock:
+            self._tagUrls[tagName] = tagUrl
+        return tagUrl
+
+    def _getTagKey(self , tagName):
+        # Tag names are cached as utf-8 strings
+        if isinstance(tagName , unicode):
+            return tagName.encode('utf-8')
+        return str(tagName)
+
+    def _forgetTagUrl(self , tagName , tagUrl):
+        """
+        Drops the cached url for the tag name if it is still tagUrl
+        """
+        with self._tagLock:
+            if self._tagUrls.get(tagName) == tagUrl:
+                del self._tagUrls[tagName]
+            self._tagObjects.pop(tagUrl , None)
+
+    def _getTag(self , tagUrl):
+        """
+        Returns the Tag object for the url, which is kept for as long as
+        the url is in the tag cache
+        """
+        tag = self._tagObjects.get(tagUrl)
+        if tag is None:
+            tag = self.getResourcesForUrls([tagUrl])[0]
+            with self._tagLock:
+                self._tagObjects[tagUrl] = tag
+        return tag
+
+    def _tagItemByName(self , item , tagName):
+        """
+        Tags the item with the named tag and returns the (tag url , 
+        tag_item url).  If tagging fails with a cached tag url, the tag
+        may have been deleted, so the url is looked up again and tagging
+        retried once.
+        """
+        tagName = self._getTagKey(tagName)
+        cached = tagName in self._tagUrls
+        tagUrl = self._getTagUrl(tagName)
+        try:
+            return (tagUrl , self._postItemTag(item , tagUrl))
+        except G3Error:
+            # A deleted tag may come back as a plain 404 (G3UnknownError)
+            # rather than a G3RequestError
+            self._forgetTagUrl(tagName , tagUrl)
+            if not cached:
+                raise
+        tagUrl = self._getTagUrl(tagName)
+        return (tagUrl , self._postItemTag(item , tagUrl))
+
+    def _postItemTag(self , item , tagUrl):
+        """
+        Tags the item with the tag url and returns the "tag_item" url
+        """
+        data = {
+            'tag': tagUrl ,
+            'item': item.url ,
+        }
+        url = self._buildUrl('index.php/rest/item_tags/%s' % item.id)
+        req = PostRequest(url , self.apiKey , data)
+        resp = self._openReq(req)
+        self._invalidate(item.url)
+        return JsonCodec.loads(resp.read())['url']
+
+    def _recordItemTag(self , item , tagItemUrl , tag=None):
+        """
+        Updates the item's relationships, and its tags if they have been
+        loaded, for a new tag.  This doesn't load the tags if they haven't
+        been.
+        """
+        members = item.relationships['tags']['members']
+        if tagItemUrl in members:
+            # The item already had the tag
+            return
+        members.append(tagItemUrl)
+        tags = item._peek('tags')
+        if tags is not None and tag is not None:
+            tags.append(tag)
+
+    def _getCreatedItem(self , url , entity , parent , lazy):
+        """
+        Returns the object for an item that has just been created, either
+        fetched or, if lazy, built from the entity fields sent to create it
+        """
+        if lazy:
+            return getPartialItem(url , entity , self , parent)
+        return getItemFromResp(self.getRespFromUrl(url) , self , parent)
+
+    def _addPendingStub(self , item):
+        with self._itemsLock:
+            self._pendingStubs[item.url] = item
+
+    def _hydrateStubs(self , stub):
+        """
+        Fetches the stub along with up to stubBatchSize - 1 of the other
+        pending stubs.  Only items can be fetched in batches, so the other
+        resources, like tags and comments, are fetched on their own.
+        """
+        batch = [stub]
+        isItem = '/rest/item/' in stub.url
+        with self._itemsLock:
+            self._pendingStubs.pop(stub.url , None)
+            if isItem:
+                for url , other in self._pendingStubs.items():
+                    if len(batch) >= self.stubBatchSize:
+                        break
+                    if '/rest/item/' in url and \
+                            other._peek('_stub') is not None:
+                        batch.append(other)
+                for other in batch:
+                    self._pendingStubs.pop(other.url , None)
+        if isItem:
+            self.getItemsForUrls([s.url for s in batch] , refresh=True)
+        if stub._peek('_stub') is not None:
+            # Not an item, or one the server left out of the batch.  Get
+            # it on its own so any error is raised.
+            stub.refresh()
+
+    def _getKnownItem(self , url):
+        """
+        Returns the already loaded object for the url, or None
+        """
+        if url is None:
+            return None
+        return self._items.get(url)
+
+    def _rememberItem(self , item):
+        """
+        Adds the item to the identity map and returns it.  If an object is
+        already mapped for the item's url, that object is returned instead.
+        """
+        with self._itemsLock:
+            existing = self._items.get(item.url)
+            if existing is not None:
+                return existing
+            self._items[item.url] = item
+        return item
+
+    def _isCacheable(self , url):
+        # Only the REST resources are cached, not the image and movie data.
+        # Queries (random images, filtered member lists and "items"
+        # batches) aren't either, since _invalidate() can't tell which
+        # items they cover and random ones must not repeat.
+        return '/rest/' in url and '/rest/data/' not in url and \
+            '?' not in url
+
+    def _getCacheKey(self , url):
+        return '%s %s' % (self.apiKey , url)
+
+    def _getCachedResp(self , url):
+        """
+        Returns the response for the url from the cache, revalidating or
+        refetching it if it has expired
+        """
+        key = self._getCacheKey(url)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.isFresh(entry):
+            return self._respFromEntry(url , entry)
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['lastModified']:
+                headers['If-Modified-Since'] = entry['lastModified']
+        req = GetRequest(url , self.apiKey , headers=headers)
+        resp = self._openReq(req)
+        if resp.code == 304 and entry is not None:
+            resp.read()
+            entry['stored'] = time.time()
+            self.cache.set(key , entry)
+            return self._respFromEntry(url , entry)
+        if resp.code != 200:
+            return resp
+        info = resp.info()
+        entry = {
+            'body': resp.read() ,
+            'headers': str(info) ,
+            'etag': info.getheader('ETag') ,
+            'lastModified': info.getheader('Last-Modified') ,
+            'stored': time.time() ,
+        }
+        self.cache.set(key , entry)
+        return self._respFromEntry(url , entry)
+
+    def _respFromEntry(self , url , entry):
+        headers = mimetools.Message(StringIO(entry['headers']))
+        return addinfourl(StringIO(entry['body']) , headers , url , 200)
+
+    def _invalidate(self , *urls):
+        """
+        Drops the cached responses for the urls after a modification
+        """
+        if self.cache is None:
+            return
+        for url in urls:
+            if url:
+                self.cache.invalidate(self._getCacheKey(url))
+
     def _getUrlFromResp(self , resp):
-        d = json.loads(resp.read())
+        d = JsonCodec.loads(resp.read())
         return d['url']
 
     def _openReq(self , req):
+        """
+        Sends the request, retrying it as the retry policy allows, and
+        returns the response
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._openOnce(req , attempt)
+            except _Retryable , e:
+                delay = self.retryPolicy.getDelay(attempt , e.retryAfter)
+                attempt += 1
+                time.sleep(delay)
+                if hasattr(req.data , 'seek'):
+                    req.data.seek(0)
+
+    def _openOnce(self , req , attempt):
+        """
+        Sends the request once.  Raises _Retryable if it failed and should
+        be retried.
+        """
+        timeout = self.timeout
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        info = RequestInfo(req , attempt)
+        req.onBodyRead = lambda n: self._bodyRead(info , n)
+        self._notify('preRequest' , info)
+        token = None
+        if self.limiter is not None:
+            token = self.limiter.acquire()
         try:
-            resp = self._opener.open(req)
+            resp = self._opener.open(req , timeout=timeout)
         except urllib2.HTTPError , e:
-            err = json.loads(e.read())
+            self._release(token , e.code in OVERLOAD_STATUSES)
+            if e.code == 304:
+                # Not modified, in response to a conditional request
+                info._finish(e.code , e.info())
+                self._notify('postRequest' , info)
+                return e
+            info._finish(e.code , e.info() , e)
+            self._notify('postRequest' , info)
+            body = e.read()
+            if self._shouldRetry(info , e.code , e):
+                raise _Retryable(e.info().getheader('Retry-After'))
+            try:
+                err = JsonCodec.loads(body)
+            except ValueError:
+                # Not all errors (a 404 from the web server for example)
+                # come back with a JSON body
+                err = None
             if isinstance(err , dict) and 'errors' in err:
                 raise G3RequestError(err['errors'])
             else:
                 raise G3UnknownError('Unknown request error: %s' % e)
+        except Exception , e:
+            self._release(token , isTimeout(e))
+            info._finish(None , error=e)
+            self._notify('postRequest' , info)
+            if self._shouldRetry(info , None , e):
+                raise _Retryable()
+            raise
+        self._release(token , False)
+        info._finish(resp.code , resp.info())
+        self._notify('postRequest' , info)
         return resp
 
+    def _shouldRetry(self , info , status , error):
+        if self.retryPolicy is None:
+            return False
+        return self.retryPolicy.shouldRetry(info.method , info.attempt ,
+            status , error)
+
+    def _release(self , token , overloaded):
+        if token is not None:
+            self.limiter.release(token , overloaded)
+
+    def _bodyRead(self , info , n):
+        info.bytesReceived = n
+        self._notify('postResponse' , info)
+
+    def _notify(self , event , info):
+        # The list is replaced rather than modified when observers are
+        # added or removed, so it can be iterated without a lock
+        for observer in self._observers:
+            try:
+                getattr(observer , event)(info)
+            except Exception:
+                pass
+
     def _isItemValid(self , item , cls):
         if not isinstance(item , cls):
             raise TypeError('Items to be modified must be descended from '
                 '%s: %s' % (cls , type(item)))
-        if not 'url' in item.__dict__:
+        if item._peek('url') is None:
             raise G3UnknownError('The object, %s, has no "url"' % item)
+        if item._peek('_stub') is not None:
+            # A stub doesn't know its type yet
+            item._hydrate()
 
 def login(host , username , passwd , g3Base='/gallery3' , port=80 , 
         ssl=False):
@@ -0,0 +1,270 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['GalleryIndex']
+
+import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    url TEXT PRIMARY KEY ,
+    id INTEGER ,
+    type TEXT ,
+    parent_url TEXT ,
+    name TEXT ,
+    title TEXT ,
+    description TEXT ,
+    created INTEGER ,
+    updated INTEGER ,
+    web_url TEXT ,
+    file_url TEXT ,
+    thumb_url TEXT ,
+    resize_url TEXT ,
+    generation INTEGER
+);
+CREATE INDEX IF NOT EXISTS items_type ON items (type);
+CREATE INDEX IF NOT EXISTS items_parent ON items (parent_url);
+CREATE INDEX IF NOT EXISTS items_updated ON items (updated);
+CREATE INDEX IF NOT EXISTS items_title ON items (title COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS item_tags (
+    item_url TEXT ,
+    tag TEXT ,
+    PRIMARY KEY (item_url , tag)
+);
+CREATE INDEX IF NOT EXISTS item_tags_tag ON item_tags (tag);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY ,
+    value TEXT
+);
+"""
+
+_ITEM_COLS = ('url' , 'id' , 'type' , 'parent_url' , 'name' , 'title' ,
+    'description' , 'created' , 'updated' , 'web_url' , 'file_url' ,
+    'thumb_url' , 'resize_url')
+
+class GalleryIndex(object):
+    """
+    A local SQLite index of the item metadata in a gallery.  The index is
+    brought up to date with refresh(), which only rewrites the items whose
+    "updated" timestamp has changed, and can then be queried without
+    talking to the server.  The query methods return the matching remote
+    objects, fetched in batches, or the raw rows if hydrate is False.
+    """
+    # The number of changed items to load the tags for at a time
+    tagBatchSize = 500
+
+    def __init__(self , gal , path):
+        """
+        gal(Gallery3)       : The gallery to index
+        path(str)           : The path to the SQLite database file
+        """
+        self.gal = gal
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def refresh(self , album=None , concurrency=None , tags=True):
+        """
+        Walks the gallery (or just the album subtree) and updates the
+        index.  Items that are new or whose "updated" timestamp has
+        changed are (re)written, along with their tags, and items that
+        have been removed from the gallery are dropped.
+
+        Note that Gallery 3 doesn't change an item's "updated" timestamp
+        when it is tagged, so tag changes on otherwise unchanged items are
+        only picked up by a refresh with tags="all".
+
+        album(Album)        : The album subtree to refresh (default: the
+                              whole gallery)
+        concurrency(int)    : The number of simultaneous requests
+                              (default: gal.concurrency)
+        tags(bool|str)      : True to index the tags of new and changed
+                              items, "all" to reindex the tags of every
+                              item or False to skip tags (default: True)
+
+        returns(dict)       : The number of items "added", "updated",
+                              "unchanged" and "removed"
+        """
+        if album is None:
+            album = self.gal.getRoot()
+        album.refresh()
+        gen = self._nextGeneration()
+        stats = {'added': 0 , 'updated': 0 , 'unchanged': 0 , 'removed': 0}
+        visited = [album.url]
+        tagQueue = []
+        db = self._db
+        try:
+            self._store(album , gen , stats)
+            for item in self.gal.walk(album , concurrency=concurrency ,
+                    refresh=True):
+                changed = self._store(item , gen , stats)
+                if item.type == 'album':
+                    visited.append(item.url)
+                if tags == 'all' or (tags and changed):
+                    tagQueue.append(item)
+                    if len(tagQueue) >= self.tagBatchSize:
+                        self._storeTags(tagQueue , concurrency)
+                        tagQueue = []
+            if tagQueue:
+                self._storeTags(tagQueue , concurrency)
+            stats['removed'] = self._prune(visited , gen)
+            db.commit()
+        except:
+            db.rollback()
+            raise
+        return stats
+
+    def byTag(self , tag , hydrate=True):
+        """
+        Returns the items with the given tag name
+        """
+        return self._query('SELECT i.* FROM items i JOIN item_tags t '
+            'ON t.item_url = i.url WHERE t.tag = ? ORDER BY i.id' , (tag ,) ,
+            hydrate)
+
+    def updatedSince(self , timestamp , hydrate=True):
+        """
+        Returns the items updated since the unix timestamp, most recently
+        updated first
+        """
+        return self._query('SELECT * FROM items WHERE updated > ? '
+            'ORDER BY updated DESC' , (int(timestamp) ,) , hydrate)
+
+    def searchTitle(self , text , hydrate=True):
+        """
+        Returns the items whose title contains the text, ignoring case
+        """
+        text = text.replace('\\' , '\\\\').replace('%' , '\\%').replace(
+            '_' , '\\_')
+        return self._query("SELECT * FROM items WHERE title LIKE ? "
+            "ESCAPE '\\' ORDER BY id" , ('%%%s%%' % text ,) , hydrate)
+
+    def byType(self , t , hydrate=True):
+        """
+        Returns the items of the entity type ("album", "photo" or "movie")
+        """
+        return self._query('SELECT * FROM items WHERE type = ? ORDER BY id' ,
+            (t ,) , hydrate)
+
+    def children(self , album , hydrate=True):
+        """
+        Returns the direct members of the album (an Album or its url)
+        """
+        url = getattr(album , 'url' , album)
+        return self._query('SELECT * FROM items WHERE parent_url = ? '
+            'ORDER BY id' , (url ,) , hydrate)
+
+    def getTags(self , item):
+        """
+        Returns the list of tag names on the item (a BaseRemote or its url)
+        """
+        url = getattr(item , 'url' , item)
+        cur = self._db.execute('SELECT tag FROM item_tags WHERE '
+            'item_url = ? ORDER BY tag' , (url ,))
+        return [r[0] for r in cur]
+
+    def _query(self , sql , params , hydrate):
+        rows = self._db.execute(sql , params).fetchall()
+        if not hydrate:
+            return [dict(zip(r.keys() , r)) for r in rows]
+        return self.gal.getItemsForUrls([r['url'] for r in rows])
+
+    def _store(self , item , gen , stats):
+        """
+        Writes the item if it is new or has changed and marks it as seen in
+        this generation.  Returns True if the item was written.
+        """
+        db = self._db
+        row = db.execute('SELECT updated , parent_url FROM items '
+            'WHERE url = ?' , (item.url ,)).fetchone()
+        vals = self._getValues(item)
+        if row is not None and row['updated'] == vals['updated'] and \
+                row['parent_url'] == vals['parent_url']:
+            db.execute('UPDATE items SET generation = ? WHERE url = ?' ,
+                (gen , item.url))
+            stats['unchanged'] += 1
+            return False
+        vals['generation'] = gen
+        cols = _ITEM_COLS + ('generation' ,)
+        db.execute('INSERT OR REPLACE INTO items (%s) VALUES (%s)' % (
+            ' , '.join(cols) , ' , '.join(['?'] * len(cols))) ,
+            [vals[c] for c in cols])
+        stats[('updated' , 'added')[row is None]] += 1
+        return True
+
+    def _storeTags(self , items , concurrency):
+        allTags = self.gal.loadTags(items , concurrency)
+        db = self._db
+        for item , tags in zip(items , allTags):
+            db.execute('DELETE FROM item_tags WHERE item_url = ?' ,
+                (item.url ,))
+            db.executemany('INSERT OR IGNORE INTO item_tags (item_url , tag) '
+                'VALUES (?, ?)' , [(item.url , t.name) for t in tags])
+
+    def _prune(self , visited , gen):
+        """
+        Deletes the items in the visited albums which weren't seen in this
+        generation and then everything below them.  Only the descendants
+        of removed items are swept, since the root of a subtree refresh
+        has no parent in the index.
+        """
+        db = self._db
+        gone = []
+        for url in visited:
+            gone.extend(row[0] for row in db.execute('SELECT url FROM items '
+                'WHERE parent_url = ? AND generation != ?' , (url , gen)))
+        removed = 0
+        while gone:
+            kids = []
+            for url in gone:
+                kids.extend(row[0] for row in db.execute('SELECT url FROM '
+                    'items WHERE parent_url = ?' , (url ,)))
+                db.execute('DELETE FROM items WHERE url = ?' , (url ,))
+                db.execute('DELETE FROM item_tags WHERE item_url = ?' ,
+                    (url ,))
+            removed += len(gone)
+            gone = kids
+        return removed
+
+    def _getValues(self , item):
+        vals = {}
+        for col in _ITEM_COLS:
+            if col == 'parent_url':
+                vals[col] = item._peek('_parent')
+            else:
+                vals[col] = item._peek(col)
+        for col in ('id' , 'created' , 'updated'):
+            if vals[col] is not None:
+                vals[col] = int(vals[col])
+        return vals
+
+    def _nextGeneration(self):
+        row = self._db.execute("SELECT value FROM meta WHERE "
+            "key = 'generation'").fetchone()
+        gen = 1
+        if row is not None:
+            gen = int(row[0]) + 1
+        self._db.execute("INSERT OR REPLACE INTO meta (key , value) VALUES "
+            "('generation' , ?)" , (str(gen) ,))
+        return gen
@@ -0,0 +1,225 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['ImageCache']
+
+from urllib import addinfourl
+from hashlib import sha1
+from cStringIO import StringIO
+import os , threading , mimetools
+
+class ImageCache(object):
+    """
+    An on-disk LRU cache for the thumbnail and resize images, limited by
+    the total size of the files.  Entries are keyed by the image url and the
+    "updated" time of the item, so a changed item gets a new entry and the
+    old one ages out.  As with DiskCache, each entry is its own file,
+    written to a temporary file and renamed into place, and the file
+    modification times track recent use, so the directory can be shared by
+    several processes.
+
+    Pass one to Gallery3 as the imageCache arg to have
+    RemoteImage.getThumbHandle() and getResizeHandle() use it.
+    """
+    def __init__(self , path , maxBytes=256 * 1024 * 1024 ,
+            chunkSize=65536):
+        """
+        path(str)           : The directory to store the images in
+        maxBytes(int)       : The maximum total size of the images.  The
+                              least recently used are evicted first.
+                              (default: 256MB)
+        chunkSize(int)      : The number of bytes to copy at a time
+                              (default: 65536)
+        """
+        self.path = path
+        self.maxBytes = int(maxBytes)
+        self.chunkSize = int(chunkSize)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._lock = threading.Lock()
+        # The locks for the entries being fetched by this process, so
+        # concurrent misses for the same image only fetch it once
+        self._fetching = {}
+        self._size = sum(size for mtime , size , fpath in self._listEntries())
+
+    def get(self , url , updated):
+        """
+        Returns a file-like handle (a urllib.addinfourl) on the cached image,
+        or None if it isn't cached
+
+        url(str)            : The url of the image
+        updated(int)        : The "updated" time of the item
+        """
+        fpath = self._getPath(url , updated)
+        try:
+            fh = open(fpath , 'rb')
+        except IOError:
+            return None
+        try:
+            hdrLen = int(fh.readline())
+            headers = mimetools.Message(StringIO(fh.read(hdrLen)))
+        except Exception:
+            # A truncated or otherwise corrupt entry
+            fh.close()
+            self._remove(fpath)
+            return None
+        try:
+            os.utime(fpath , None)
+        except OSError:
+            pass
+        return addinfourl(fh , headers , url , 200)
+
+    def store(self , url , updated , resp):
+        """
+        Copies the response into the cache and returns a handle on the
+        cached copy
+
+        url(str)            : The url of the image
+        updated(int)        : The "updated" time of the item
+        resp(addinfourl)    : The response for the url
+
+        returns(addinfourl)
+        """
+        fpath = self._getPath(url , updated)
+        tmpPath = '%s.%d.%d.tmp' % (fpath , os.getpid() ,
+            threading.current_thread().ident)
+        headers = str(resp.info())
+        fh = open(tmpPath , 'wb')
+        try:
+            try:
+                fh.write('%d\n%s' % (len(headers) , headers))
+                while True:
+                    data = resp.read(self.chunkSize)
+                    if not data:
+                        break
+                    fh.write(data)
+            finally:
+                fh.close()
+                resp.close()
+            size = os.path.getsize(tmpPath)
+            isNew = not os.path.exists(fpath)
+            os.rename(tmpPath , fpath)
+        except:
+            self._remove(tmpPath)
+            raise
+        # Open it before any eviction, which may remove it
+        ret = self.get(url , updated)
+        with self._lock:
+            if isNew:
+                self._size += size
+            if self._size > self.maxBytes:
+                self._evict()
+        return ret
+
+    def getHandle(self , url , updated , fetch):
+        """
+        Returns a handle on the cached image, fetching and storing it first
+        if it isn't cached
+
+        url(str)            : The url of the image
+        updated(int)        : The "updated" time of the item
+        fetch(callable)     : Called with the url to get the response
+
+        returns(addinfourl)
+        """
+        ret = self.get(url , updated)
+        if ret is not None:
+            return ret
+        key = self._getPath(url , updated)
+        with self._lock:
+            lock = self._fetching.setdefault(key , [threading.Lock() , 0])
+            lock[1] += 1
+        try:
+            with lock[0]:
+                ret = self.get(url , updated)
+                if ret is None:
+                    ret = self.store(url , updated , fetch(url))
+                if ret is None:
+                    # Removed by another process before it could be opened
+                    ret = fetch(url)
+                return ret
+        finally:
+            with self._lock:
+                lock[1] -= 1
+                if not lock[1]:
+                    del self._fetching[key]
+
+    def invalidate(self , url , updated):
+        """
+        Removes the image from the cache, if it is there
+        """
+        self._remove(self._getPath(url , updated))
+
+    def clear(self):
+        """
+        Removes all the images
+        """
+        with self._lock:
+            for mtime , size , fpath in self._listEntries():
+                self._remove(fpath)
+            self._size = 0
+
+    def _evict(self):
+        """
+        Removes the least recently used images until the cache is down to
+        90% of maxBytes.  This must be called with the lock held.  The
+        files are rescanned since other processes may share the directory.
+        """
+        entries = self._listEntries()
+        entries.sort()
+        total = sum(size for mtime , size , fpath in entries)
+        target = int(self.maxBytes * 0.9)
+        for mtime , size , fpath in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(fpath)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def _remove(self , fpath):
+        try:
+            os.remove(fpath)
+        except OSError:
+            pass
+
+    def _listEntries(self):
+        """
+        Returns a list of (mtime , size , path) for the cached images
+        """
+        ret = []
+        for f in os.listdir(self.path):
+            if not f.endswith('.img'):
+                continue
+            fpath = os.path.join(self.path , f)
+            try:
+                st = os.stat(fpath)
+            except OSError:
+                continue
+            ret.append((st.st_mtime , st.st_size , fpath))
+        return ret
+
+    def _getPath(self , url , updated):
+        if isinstance(url , unicode):
+            url = url.encode('utf-8')
+        key = '%s\n%s' % (url , updated)
+        return os.path.join(self.path , '%s.img' % sha1(key).hexdigest())
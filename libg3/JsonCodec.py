@@ -0,0 +1,143 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+The JSON encoding and decoding used for all the REST requests and
+responses.  The fastest installed backend is picked at import time, in the
+order of BACKENDS, unless the PYLIBGAL3_JSON environment variable names
+one.  setBackend() switches it at run time.
+
+Use JsonCodec.loads() and JsonCodec.dumps() rather than importing the
+functions themselves, since setBackend() replaces them.  Whichever backend
+is in use, dumps() returns a compact str and loads() raises a ValueError
+for invalid JSON.
+"""
+
+__all__ = ['BACKENDS' , 'loads' , 'dumps' , 'getBackend' , 'setBackend' ,
+    'availableBackends' , 'loadBackend']
+
+import os
+
+# The supported backends, fastest first
+BACKENDS = ('orjson' , 'ujson' , 'simplejson' , 'json')
+
+# The environment variable that overrides the backend picked at import
+ENV_VAR = 'PYLIBGAL3_JSON'
+
+def _orjson():
+    import orjson
+
+    def dumps(obj):
+        s = orjson.dumps(obj)
+        if not isinstance(s , str):
+            s = s.decode('utf-8')
+        return s
+
+    return (orjson.loads , dumps)
+
+def _ujson():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj , ensure_ascii=True)
+
+    return (ujson.loads , dumps)
+
+def _simplejson():
+    import simplejson
+
+    def dumps(obj):
+        return simplejson.dumps(obj , separators=(',' , ':'))
+
+    return (simplejson.loads , dumps)
+
+def _json():
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj , separators=(',' , ':'))
+
+    return (json.loads , dumps)
+
+_FACTORIES = {
+    'orjson': _orjson ,
+    'ujson': _ujson ,
+    'simplejson': _simplejson ,
+    'json': _json ,
+}
+
+def loadBackend(name):
+    """
+    Returns the (loads , dumps) functions for the backend without making it
+    the one in use
+
+    name(str)           : One of BACKENDS
+
+    returns(tuple)
+    """
+    if name not in _FACTORIES:
+        raise ValueError('Unknown JSON backend: %s.  Use one of: %s' % (
+            name , ', '.join(BACKENDS)))
+    return _FACTORIES[name]()
+
+def availableBackends():
+    """
+    Returns the names of the backends that are installed, fastest first
+
+    returns(list[str])
+    """
+    ret = []
+    for name in BACKENDS:
+        try:
+            loadBackend(name)
+        except ImportError:
+            continue
+        ret.append(name)
+    return ret
+
+def getBackend():
+    """
+    Returns the name of the backend in use
+
+    returns(str)
+    """
+    return _backend
+
+def setBackend(name=None):
+    """
+    Switches the backend used by loads() and dumps()
+
+    name(str)           : One of BACKENDS, or None for the fastest one
+                          installed.  An ImportError is raised if it isn't
+                          installed.
+    """
+    global loads , dumps , _backend
+    if name is None:
+        name = availableBackends()[0]
+    loads , dumps = loadBackend(name)
+    _backend = name
+
+_backend = None
+loads = dumps = None
+try:
+    setBackend(os.environ.get(ENV_VAR) or None)
+except ImportError , e:
+    raise ImportError('The JSON backend set in %s is not installed: %s' % (
+        ENV_VAR , e))
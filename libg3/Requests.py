@@ -19,55 +19,135 @@
 #
 
 __all__ = ['BaseRequest' , 'GetRequest' , 'PostRequest' , 'PutRequest' , 
-    'DeleteRequest']
+    'DeleteRequest' , 'StreamBody']
 
 from urllib2 import Request
 from urllib import quote
-import os , json , types
+import os , types
+import JsonCodec
 
 class BaseRequest(Request):
+    # The method sent in the X-Gallery-Request-Method header
+    g3Method = None
+
     def __init__(self , url , apiKey , data=None , headers={} , 
             origin_req_host=None , unverifiable=False):
         url = url.encode('utf-8')
+        headers = dict(headers)
+        self.bodySize = 0
+        if self.g3Method is not None:
+            headers['X-Gallery-Request-Method'] = self.g3Method
         if apiKey is not None:
             headers['X-Gallery-Request-Key'] = apiKey
         if data is not None:
             if isinstance(data , dict):
-                data = 'entity=%s' % quote(json.dumps(data , 
-                    separators=(',' , ':')))
-            elif type(data) not in types.StringTypes:
+                data = 'entity=%s' % quote(JsonCodec.dumps(data))
+            elif not hasattr(data , 'read') and \
+                    type(data) not in types.StringTypes:
                 raise TypeError('Invalid type for data.  It should be '
-                    'a "dict" or "str", not %s' % type(data))
-            headers['Content-Length'] = str(len(data))
+                    'a "dict", "str" or "StreamBody", not %s' % type(data))
+            self.bodySize = len(data)
+            headers['Content-Length'] = str(self.bodySize)
         Request.__init__(self , url , data , headers , origin_req_host ,
             unverifiable)
 
 class GetRequest(BaseRequest):
+    g3Method = 'get'
+
     def __init__(self , url , apiKey , data=None , headers={} , 
             origin_req_host=None , unverifiable=False):
-        headers['X-Gallery-Request-Method'] = 'get'
+        headers = dict(headers)
         BaseRequest.__init__(self , url , apiKey , data , headers , 
             origin_req_host , unverifiable)
 
 class PostRequest(BaseRequest):
+    g3Method = 'post'
+
     def __init__(self , url , apiKey , data , headers={} , 
             origin_req_host=None , unverifiable=False):
-        headers['X-Gallery-Request-Method'] = 'post'
+        headers = dict(headers)
         if 'Content-Type' not in headers:
             headers['Content-Type'] = 'application/x-www-form-urlencoded'
         BaseRequest.__init__(self , url , apiKey , data , headers , 
             origin_req_host , unverifiable)
 
 class PutRequest(BaseRequest):
+    g3Method = 'put'
+
     def __init__(self , url , apiKey , data=None , headers={} , 
             origin_req_host=None , unverifiable=False):
-        headers['X-Gallery-Request-Method'] = 'put'
+        headers = dict(headers)
         BaseRequest.__init__(self , url , apiKey , data , headers , 
             origin_req_host , unverifiable)
 
 class DeleteRequest(BaseRequest):
+    g3Method = 'delete'
+
     def __init__(self , url , apiKey , data=None , headers={} , 
             origin_req_host=None , unverifiable=False):
-        headers['X-Gallery-Request-Method'] = 'delete'
+        headers = dict(headers)
         BaseRequest.__init__(self , url , apiKey , data , headers , 
             origin_req_host , unverifiable)
+
+class StreamBody(object):
+    """
+    A file-like request body made up of strings and open files.  The files
+    are read a chunk at a time as the request is sent so the entire body
+    never has to be held in memory.
+    """
+    def __init__(self , parts):
+        """
+        parts(list[str|file])   : The strings and files, in order, that make
+                                  up the body.  Files are read from their
+                                  beginning to their end.
+        """
+        self._parts = []
+        self._size = 0
+        for p in parts:
+            if isinstance(p , unicode):
+                p = p.encode('utf-8')
+            if isinstance(p , str):
+                size = len(p)
+            else:
+                size = os.fstat(p.fileno()).st_size
+            self._parts.append((p , size))
+            self._size += size
+        self.seek(0)
+
+    def __len__(self):
+        return self._size
+
+    def seek(self , offset):
+        """
+        Rewinds the body so it can be sent again.  Only seeking to the
+        beginning is supported.
+        """
+        if offset != 0:
+            raise IOError('A StreamBody can only be rewound to the beginning')
+        self._idx = 0
+        self._partPos = 0
+
+    def read(self , size=-1):
+        """
+        Reads up to size bytes from the body.  An empty string is returned
+        once the end of the body has been reached.
+        """
+        if size < 0:
+            size = self._size
+        while self._idx < len(self._parts):
+            part , partSize = self._parts[self._idx]
+            if self._partPos >= partSize:
+                self._idx += 1
+                self._partPos = 0
+                continue
+            if isinstance(part , str):
+                data = part[self._partPos:self._partPos + size]
+            else:
+                part.seek(self._partPos)
+                data = part.read(min(size , partSize - self._partPos))
+                if not data:
+                    raise IOError('%s was truncated while being read' % 
+                        part.name)
+            self._partPos += len(data)
+            return data
+        return ''
@@ -0,0 +1,237 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['MemoryCache' , 'DiskCache']
+
+from collections import OrderedDict
+from hashlib import sha1
+import os , threading , time
+import JsonCodec
+
+class BaseCache(object):
+    """
+    The interface for the response caches.  A cache entry is a dict with
+    the following keys:
+
+        body(str)           : The response body
+        headers(str)        : The raw response headers
+        etag(str)           : The ETag header, if any
+        lastModified(str)   : The Last-Modified header, if any
+        stored(float)       : The time the entry was stored or last
+                              revalidated
+    """
+    def __init__(self , maxItems=1000 , ttl=60):
+        """
+        maxItems(int)       : The maximum number of responses to keep.  The
+                              least recently used are evicted first.
+                              (default: 1000)
+        ttl(float)          : The number of seconds a response is used
+                              without asking the server.  After that, it is
+                              revalidated with a conditional GET if the
+                              server sent an ETag or Last-Modified header
+                              or refetched otherwise.  None means never
+                              expire. (default: 60)
+        """
+        self.maxItems = int(maxItems)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def isFresh(self , entry):
+        """
+        Returns True if the entry can be used without revalidating it
+        """
+        return self.ttl is None or time.time() - entry['stored'] < self.ttl
+
+    def get(self , key):
+        """
+        Returns the entry for the key, fresh or not, or None
+        """
+        raise NotImplementedError
+
+    def set(self , key , entry):
+        """
+        Stores the entry for the key
+        """
+        raise NotImplementedError
+
+    def invalidate(self , key):
+        """
+        Removes the entry for the key, if there is one
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes all the entries
+        """
+        raise NotImplementedError
+
+class MemoryCache(BaseCache):
+    """
+    An in memory LRU response cache
+    """
+    def __init__(self , maxItems=1000 , ttl=60):
+        BaseCache.__init__(self , maxItems , ttl)
+        self._entries = OrderedDict()
+
+    def get(self , key):
+        with self._lock:
+            entry = self._entries.pop(key , None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self , key , entry):
+        with self._lock:
+            self._entries.pop(key , None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxItems:
+                self._entries.popitem(last=False)
+
+    def invalidate(self , key):
+        with self._lock:
+            self._entries.pop(key , None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class DiskCache(BaseCache):
+    """
+    An on-disk LRU response cache.  Each entry is stored in its own file
+    and the file modification times are used to track recent use, so a
+    cache directory can be shared by several processes.  The entries are
+    stored as JSON, never pickles, so a file planted in a shared directory
+    can't run code in the client.
+    """
+    # The entry fields which hold raw strings.  They are stored as latin-1
+    # so that any bytes survive the trip through JSON.
+    _strFields = ('body' , 'headers' , 'etag' , 'lastModified')
+
+    def __init__(self , path , maxItems=10000 , ttl=60):
+        """
+        path(str)           : The directory to store the entries in
+        """
+        BaseCache.__init__(self , maxItems , ttl)
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._count = len(self._listEntries())
+
+    def get(self , key):
+        fpath = self._getPath(key)
+        try:
+            fh = open(fpath , 'rb')
+        except IOError:
+            return None
+        try:
+            entry = self._decode(fh.read())
+        except Exception:
+            # A truncated or otherwise corrupt entry
+            entry = None
+        finally:
+            fh.close()
+        if entry is None:
+            self.invalidate(key)
+            return None
+        try:
+            os.utime(fpath , None)
+        except OSError:
+            pass
+        return entry
+
+    def set(self , key , entry):
+        fpath = self._getPath(key)
+        tmpPath = '%s.%d.%d.tmp' % (fpath , os.getpid() ,
+            threading.current_thread().ident)
+        fh = open(tmpPath , 'wb')
+        try:
+            fh.write(self._encode(entry))
+        finally:
+            fh.close()
+        isNew = not os.path.exists(fpath)
+        os.rename(tmpPath , fpath)
+        with self._lock:
+            if isNew:
+                self._count += 1
+            if self._count <= self.maxItems:
+                return
+            self._evict()
+
+    def invalidate(self , key):
+        try:
+            os.remove(self._getPath(key))
+        except OSError:
+            return
+        with self._lock:
+            self._count -= 1
+
+    def clear(self):
+        with self._lock:
+            for fpath in self._listEntries():
+                try:
+                    os.remove(fpath)
+                except OSError:
+                    pass
+            self._count = 0
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache is down to
+        90% of maxItems.  This must be called with the lock held.
+        """
+        entries = []
+        for fpath in self._listEntries():
+            try:
+                entries.append((os.path.getmtime(fpath) , fpath))
+            except OSError:
+                pass
+        entries.sort()
+        numRemove = len(entries) - int(self.maxItems * 0.9)
+        for mtime , fpath in entries[:max(numRemove , 0)]:
+            try:
+                os.remove(fpath)
+            except OSError:
+                pass
+        self._count = len(entries) - max(numRemove , 0)
+
+    def _encode(self , entry):
+        data = dict(entry)
+        for k in self._strFields:
+            if isinstance(data.get(k) , str):
+                data[k] = data[k].decode('latin-1')
+        return JsonCodec.dumps(data)
+
+    def _decode(self , data):
+        entry = JsonCodec.loads(data)
+        for k in self._strFields:
+            if entry[k] is not None:
+                entry[k] = entry[k].encode('latin-1')
+        entry['stored'] = float(entry['stored'])
+        return entry
+
+    def _listEntries(self):
+        return [os.path.join(self.path , f) for f in os.listdir(self.path)
+            if f.endswith('.entry')]
+
+    def _getPath(self , key):
+        if isinstance(key , unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path , '%s.entry' % sha1(key).hexdigest())
@@ -0,0 +1,172 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['RetryPolicy' , 'AdaptiveLimiter']
+
+from urllib2 import URLError
+import threading , random , socket , time
+
+# The status codes a server sends when it is overloaded
+OVERLOAD_STATUSES = (429 , 502 , 503 , 504)
+
+def isTimeout(error):
+    """
+    Returns True if the exception is (or wraps) a socket timeout
+    """
+    if isinstance(error , URLError):
+        error = getattr(error , 'reason' , None)
+    return isinstance(error , socket.timeout)
+
+class RetryPolicy(object):
+    """
+    Decides which failed requests are retried and how long to wait before
+    each retry.  Only requests with idempotent methods are retried, on
+    the given status codes, timeouts and connection errors.  The delays
+    back off exponentially with "full jitter", a random delay between 0
+    and the backoff, so that many clients don't retry in lock step.  A
+    Retry-After header from the server is honoured if it is longer.
+    """
+    def __init__(self , maxRetries=3 , backoff=0.5 , maxBackoff=30 ,
+            statuses=(429 , 500 , 502 , 503 , 504) ,
+            methods=('get' , 'put' , 'delete')):
+        """
+        maxRetries(int)     : The maximum number of retries of a request
+                              (default: 3)
+        backoff(float)      : The base delay in seconds, doubled after each
+                              retry (default: 0.5)
+        maxBackoff(float)   : The maximum delay in seconds (default: 30)
+        statuses(tuple)     : The HTTP status codes to retry on
+        methods(tuple)      : The Gallery 3 methods that can be retried
+        """
+        self.maxRetries = int(maxRetries)
+        self.backoff = float(backoff)
+        self.maxBackoff = float(maxBackoff)
+        self.statuses = tuple(statuses)
+        self.methods = tuple(methods)
+
+    def shouldRetry(self , method , attempt , status=None , error=None):
+        """
+        Returns True if the failed request should be retried
+
+        method(str)         : The Gallery 3 method of the request
+        attempt(int)        : The number of retries made so far
+        status(int)         : The HTTP status of the response, or None if
+                              there was no response
+        error(Exception)    : The exception raised for the failure
+        """
+        if attempt >= self.maxRetries or method not in self.methods:
+            return False
+        if status is not None:
+            return status in self.statuses
+        # No response at all: a timeout or a connection error
+        return isinstance(error , (URLError , socket.error))
+
+    def getDelay(self , attempt , retryAfter=None):
+        """
+        Returns the number of seconds to wait before the retry
+
+        attempt(int)        : The number of retries made so far
+        retryAfter(str)     : The value of a Retry-After header, if any
+        """
+        delay = random.uniform(0 , min(self.maxBackoff ,
+            self.backoff * 2 ** attempt))
+        if retryAfter and retryAfter.strip().isdigit():
+            delay = max(delay , min(self.maxBackoff , int(retryAfter)))
+        return delay
+
+class AdaptiveLimiter(object):
+    """
+    Limits the number of requests waiting on the server at once, adjusting
+    the limit with AIMD (additive increase, multiplicative decrease): each
+    successful request grows the limit by increase / limit, so about
+    "increase" per limit's worth of requests, and each sign of overload (a
+    429, 502, 503 or 504 response or a timeout) multiplies it by
+    "decrease".  Overload signals from requests started before the last
+    decrease are ignored so that a single burst of failures only backs off
+    once.
+
+    The slot is held until the response headers arrive, so the limit
+    applies to the time the server spends working on the requests rather
+    than the time spent transferring response bodies.
+    """
+    def __init__(self , initial=8 , minLimit=1 , maxLimit=64 , increase=1.0 ,
+            decrease=0.5):
+        """
+        initial(int)        : The starting limit (default: 8)
+        minLimit(int)       : The lowest the limit goes (default: 1)
+        maxLimit(int)       : The highest the limit goes (default: 64)
+        increase(float)     : The additive increase (default: 1)
+        decrease(float)     : The multiplicative decrease (default: 0.5)
+        """
+        self.minLimit = int(minLimit)
+        self.maxLimit = int(maxLimit)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self._limit = float(max(self.minLimit , min(self.maxLimit ,
+            initial)))
+        self._inFlight = 0
+        self._lastDecrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        The current limit
+        """
+        return int(self._limit)
+
+    @property
+    def inFlight(self):
+        """
+        The number of requests currently holding a slot
+        """
+        return self._inFlight
+
+    def acquire(self):
+        """
+        Waits for a free slot and takes it
+
+        returns(float)      : A token to pass to release()
+        """
+        with self._cond:
+            while self._inFlight >= int(self._limit):
+                self._cond.wait(1)
+            self._inFlight += 1
+        return time.time()
+
+    def release(self , token , overloaded=False):
+        """
+        Gives back a slot taken with acquire() and adjusts the limit
+
+        token(float)        : The return value from acquire()
+        overloaded(bool)    : True if the request showed the server is
+                              overloaded
+        """
+        with self._cond:
+            self._inFlight -= 1
+            if overloaded:
+                if token >= self._lastDecrease:
+                    self._limit = max(float(self.minLimit) ,
+                        self._limit * self.decrease)
+                    self._lastDecrease = time.time()
+            else:
+                self._limit = min(float(self.maxLimit) ,
+                    self._limit + self.increase / self._limit)
+            self._cond.notify_all()
@@ -0,0 +1,245 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['RequestInfo' , 'RequestObserver' , 'StatsCollector' ,
+    'urlTemplate']
+
+from urlparse import urlsplit
+import threading , time , re
+
+_ID_RE = re.compile(r'(?<=[/,])\d+(?=[/,]|$)')
+
+def urlTemplate(url):
+    """
+    Returns the url reduced to a template for grouping requests by
+    endpoint.  The scheme, host, query and the path up to the REST root
+    are dropped and the numeric ids are replaced with "{id}", so
+    "http://host/gallery3/index.php/rest/item/12?type=photo" becomes
+    "item/{id}".
+
+    url(str)            : The url to reduce
+
+    returns(str)
+    """
+    path = urlsplit(url)[2]
+    idx = path.find('/rest/')
+    if idx >= 0:
+        path = path[idx + 6:]
+    return _ID_RE.sub('{id}' , path)
+
+class RequestInfo(object):
+    """
+    The details of a single request passed to the observers.  The same
+    object is passed to preRequest(), postRequest() and postResponse(),
+    with the response fields filled in for the latter two.
+
+    method(str)         : The Gallery 3 method (get, post, put or delete)
+    url(str)            : The full url of the request
+    template(str)       : The url template (see urlTemplate())
+    bytesSent(int)      : The size of the request body
+    attempt(int)        : The number of times the request has been
+                          retried before this attempt
+    start(float)        : The time.time() when the request was started
+    status(int)         : The HTTP status code, or None if no response was
+                          received
+    error(Exception)    : The exception raised by the request, or None
+    elapsed(float)      : The seconds until the response headers arrived
+                          or the request failed
+    bytesReceived(int)  : In postRequest(), the Content-Length of the
+                          response, or None if the server didn't send one
+                          (REST replies are often chunked).  In
+                          postResponse(), the number of body bytes that
+                          were actually read.
+    """
+    __slots__ = ('method' , 'url' , 'template' , 'bytesSent' , 'attempt' ,
+        'start' , 'status' , 'error' , 'elapsed' , 'bytesReceived')
+
+    def __init__(self , req , attempt=0):
+        self.method = getattr(req , 'g3Method' , None) or \
+            req.get_method().lower()
+        self.url = req.get_full_url()
+        self.template = urlTemplate(self.url)
+        self.bytesSent = getattr(req , 'bodySize' , 0)
+        self.attempt = attempt
+        self.start = time.time()
+        self.status = None
+        self.error = None
+        self.elapsed = None
+        self.bytesReceived = None
+
+    def __repr__(self):
+        return '<RequestInfo %s %s %s %s>' % (self.method , self.template ,
+            self.status , self.elapsed)
+
+    def _finish(self , status , headers=None , error=None):
+        self.elapsed = time.time() - self.start
+        self.status = status
+        self.error = error
+        if headers is not None:
+            length = headers.getheader('Content-Length')
+            if length and length.isdigit():
+                self.bytesReceived = int(length)
+
+class RequestObserver(object):
+    """
+    The base class for the objects registered with Gallery3.addObserver().
+    Observers are called in the thread making the request, so they must be
+    thread safe and should be quick.  Any exceptions they raise are
+    ignored.
+    """
+    def preRequest(self , info):
+        """
+        Called just before the request is sent
+
+        info(RequestInfo)   : The request details
+        """
+        pass
+
+    def postRequest(self , info):
+        """
+        Called when the response headers have arrived, or the request has
+        failed
+
+        info(RequestInfo)   : The request and response details
+        """
+        pass
+
+    def postResponse(self , info):
+        """
+        Called once the response body has been read to the end, or the
+        response closed before that, with bytesReceived set to the number
+        of body bytes read.  This is called in the thread reading the body,
+        and not at all for a response that is never read or closed.
+
+        info(RequestInfo)   : The request and response details
+        """
+        pass
+
+class StatsCollector(RequestObserver):
+    """
+    Collects request counts, errors, bytes and latency histograms grouped
+    by method and url template.  Every Gallery3 has one registered by
+    default, which is what Gallery3.stats() reports.
+    """
+    # The upper bounds of the latency histogram buckets, in milliseconds
+    buckets = (5 , 10 , 25 , 50 , 100 , 250 , 500 , 1000 , 2500 , 5000 ,
+        10000 , 30000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all the collected stats
+        """
+        with self._lock:
+            self._endpoints = {}
+            self._since = time.time()
+
+    def postRequest(self , info):
+        key = '%s %s' % (info.method , info.template)
+        ms = info.elapsed * 1000
+        bucket = len(self.buckets)
+        for i , bound in enumerate(self.buckets):
+            if ms <= bound:
+                bucket = i
+                break
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is None:
+                ep = self._endpoints[key] = {
+                    'count': 0 ,
+                    'errors': 0 ,
+                    'retries': 0 ,
+                    'statuses': {} ,
+                    'bytesSent': 0 ,
+                    'bytesReceived': 0 ,
+                    'totalMs': 0.0 ,
+                    'maxMs': 0.0 ,
+                    'histogram': [0] * (len(self.buckets) + 1) ,
+                }
+            ep['count'] += 1
+            if info.error is not None or info.status is None or \
+                    info.status >= 400:
+                ep['errors'] += 1
+            if info.attempt:
+                ep['retries'] += 1
+            ep['statuses'][info.status] = ep['statuses'].get(
+                info.status , 0) + 1
+            ep['bytesSent'] += info.bytesSent
+            ep['totalMs'] += ms
+            ep['maxMs'] = max(ep['maxMs'] , ms)
+            ep['histogram'][bucket] += 1
+
+    def postResponse(self , info):
+        key = '%s %s' % (info.method , info.template)
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is not None:
+                ep['bytesReceived'] += info.bytesReceived or 0
+
+    def snapshot(self):
+        """
+        Returns a copy of the stats collected so far
+
+        returns(dict)       : "since" (the time.time() the collection
+                              started), "requests" and "errors" (the
+                              totals), "buckets" (the histogram bucket
+                              upper bounds) and "endpoints", a dict of
+                              "<method> <template>" to a dict of "count",
+                              "errors", "retries", "statuses", "bytesSent",
+                              "bytesReceived", "meanMs", "maxMs", the
+                              "histogram" counts and the "p50Ms", "p90Ms"
+                              and "p99Ms" estimated from the histogram
+        """
+        with self._lock:
+            endpoints = {}
+            for key , ep in self._endpoints.items():
+                ep = dict(ep)
+                ep['statuses'] = dict(ep['statuses'])
+                ep['histogram'] = list(ep['histogram'])
+                endpoints[key] = ep
+            since = self._since
+        requests = errors = 0
+        for ep in endpoints.values():
+            requests += ep['count']
+            errors += ep['errors']
+            ep['meanMs'] = ep.pop('totalMs') / ep['count']
+            for p in (50 , 90 , 99):
+                ep['p%dMs' % p] = self._percentile(ep , p)
+        return {
+            'since': since ,
+            'requests': requests ,
+            'errors': errors ,
+            'buckets': list(self.buckets) ,
+            'endpoints': endpoints ,
+        }
+
+    def _percentile(self , ep , p):
+        target = ep['count'] * p / 100.0
+        seen = 0
+        for i , n in enumerate(ep['histogram']):
+            seen += n
+            if n and seen >= target:
+                if i < len(self.buckets):
+                    return float(min(self.buckets[i] , ep['maxMs']))
+                break
+        return ep['maxMs']
@@ -0,0 +1,273 @@
+#
+#    Author: Jay Deiman
+#    Email: admin@splitstreams.com
+#
+#    This file is part of pylibgal3.
+#
+#    pylibgal3 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    pylibgal3 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with pylibgal3.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+__all__ = ['parallelMap' , 'parallelImap' , 'Future' , 'Executor']
+
+from Errors import G3TimeoutError
+import threading , sys , Queue
+
+def parallelMap(func , items , concurrency=1):
+    """
+    Calls func on each of the items using up to "concurrency" threads and
+    returns the results in the same order as the items.  If any of the
+    calls raises an exception, no new calls are started and the first
+    exception is re-raised once the running calls have finished.
+
+    func(callable)      : The function to call with each item
+    items(iterable)     : The items to call func with
+    concurrency(int)    : The maximum number of simultaneous calls
+
+    returns(list)       : The list of return values from func
+    """
+    items = list(items)
+    numThreads = min(int(concurrency) , len(items))
+    if numThreads <= 1:
+        return [func(i) for i in items]
+    results = [None] * len(items)
+    errors = []
+    jobs = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if errors:
+                    return
+                try:
+                    idx , item = jobs.next()
+                except StopIteration:
+                    return
+            try:
+                results[idx] = func(item)
+            except:
+                with lock:
+                    errors.append(sys.exc_info())
+                return
+
+    threads = [threading.Thread(target=worker) for i in xrange(numThreads)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        eType , eVal , eTb = errors[0]
+        raise eType , eVal , eTb
+    return results
+
+def parallelImap(func , items , concurrency=1):
+    """
+    A generator version of parallelMap() which yields the results as the
+    calls finish, in no particular order.  If a call raises an exception,
+    it is re-raised by the generator.  If the generator is closed early,
+    no new calls are started.
+
+    func(callable)      : The function to call with each item
+    items(iterable)     : The items to call func with
+    concurrency(int)    : The maximum number of simultaneous calls
+
+    returns(generator)  : The return values from func
+    """
+    items = list(items)
+    numThreads = min(int(concurrency) , len(items))
+    if numThreads <= 1:
+        for i in items:
+            yield func(i)
+        return
+    jobs = iter(items)
+    lock = threading.Lock()
+    results = Queue.Queue()
+    state = {'stop': False}
+
+    def worker():
+        while True:
+            with lock:
+                if state['stop']:
+                    break
+                try:
+                    item = jobs.next()
+                except StopIteration:
+                    break
+            try:
+                results.put((True , func(item)))
+            except:
+                results.put((False , sys.exc_info()))
+        # Let the consumer know this worker is done
+        results.put(None)
+
+    for i in xrange(numThreads):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+    running = numThreads
+    try:
+        while running:
+            res = results.get()
+            if res is None:
+                running -= 1
+                continue
+            success , val = res
+            if not success:
+                eType , eVal , eTb = val
+                raise eType , eVal , eTb
+            yield val
+    finally:
+        state['stop'] = True
+
+class Future(object):
+    """
+    The pending result of a call submitted to an Executor
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._excInfo = None
+        self._callbacks = []
+
+    def done(self):
+        """
+        Returns True if the call has finished
+        """
+        return self._event.is_set()
+
+    def result(self , timeout=None):
+        """
+        Waits for the call to finish and returns its result.  If the call
+        raised an exception, it is re-raised here.
+
+        timeout(float)      : The maximum number of seconds to wait
+                              (default: wait forever)
+        """
+        self._wait(timeout)
+        if self._excInfo is not None:
+            eType , eVal , eTb = self._excInfo
+            raise eType , eVal , eTb
+        return self._result
+
+    def exception(self , timeout=None):
+        """
+        Waits for the call to finish and returns the exception it raised,
+        or None if it succeeded
+
+        timeout(float)      : The maximum number of seconds to wait
+                              (default: wait forever)
+        """
+        self._wait(timeout)
+        if self._excInfo is None:
+            return None
+        return self._excInfo[1]
+
+    def addCallback(self , func):
+        """
+        Calls func with this future once the call has finished.  If it has
+        already finished, func is called immediately.  Callbacks run in the
+        worker thread that finished the call.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def _wait(self , timeout):
+        # Event.wait() without a timeout can't be interrupted in python 2
+        if timeout is None:
+            while not self._event.wait(3600):
+                pass
+        elif not self._event.wait(timeout):
+            raise G3TimeoutError('Timed out waiting for the result')
+
+    def _finish(self , result , excInfo):
+        with self._lock:
+            self._result = result
+            self._excInfo = excInfo
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for func in callbacks:
+            try:
+                func(self)
+            except:
+                pass
+
+class Executor(object):
+    """
+    Runs submitted calls on a fixed number of worker threads, which are 
+    started as they are needed
+    """
+    def __init__(self , maxWorkers=8):
+        """
+        maxWorkers(int)     : The maximum number of calls run at once
+                              (default: 8)
+        """
+        self.maxWorkers = int(maxWorkers)
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self , func , *args , **kwargs):
+        """
+        Schedules func(*args , **kwargs) to be run and returns the Future
+        for its result
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit after shutdown')
+            self._queue.put((future , func , args , kwargs))
+            if self._idle > 0:
+                self._idle -= 1
+            elif len(self._threads) < self.maxWorkers:
+                t = threading.Thread(target=self._work)
+                t.daemon = True
+                self._threads.append(t)
+                t.start()
+        return future
+
+    def shutdown(self , wait=True):
+        """
+        Stops the worker threads once the calls already submitted are done
+
+        wait(bool)      : If True, wait for the threads to finish
+        """
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+        for t in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            future , func , args , kwargs = job
+            try:
+                future._finish(func(*args , **kwargs) , None)
+            except:
+                future._finish(None , sys.exc_info())
+            with self._lock:
+                self._idle += 1
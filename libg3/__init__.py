@@ -20,5 +20,12 @@
 
 from G3Items import *
 from Gallery3 import *
+from AlbumMirror import *
+from RespCache import *
+from AsyncGallery3 import *
+from GalleryIndex import *
+from Stats import *
+from Retry import *
+from ImageCache import *
 
 __version__ = '0.1.7'